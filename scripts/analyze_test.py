@@ -19,6 +19,8 @@ import pandas as pd
 import numpy as np
 from scipy.stats import pearsonr, linregress
 
+from dependence import DependenceCache
+
 # ---------- Configuration ----------
 DATA_DIR        = Path(__file__).resolve().parent.parent / "data"
 CO2_FILE        = "co2_history_cleaned.csv"
@@ -82,6 +84,7 @@ def correlate(df_sensor: pd.DataFrame, df_oura: pd.DataFrame) -> pd.DataFrame:
     merged = pd.merge(df_sensor, df_oura, on='date')
     sensor_cols = ['mean_co2', 'max_co2', 'std_co2',
                    'early_mean_co2', 'late_mean_co2']
+    dependence = DependenceCache(merged)
     results = []
 
     for s_col in sensor_cols:
@@ -102,7 +105,8 @@ def correlate(df_sensor: pd.DataFrame, df_oura: pd.DataFrame) -> pd.DataFrame:
                 'N nights'    : len(Y),
                 'r'           : round(r, 3),
                 'p'           : round(p, 4),
-                'slope'       : round(slope, 3)
+                'slope'       : round(slope, 3),
+                **dependence.measures(s_col, o_col)
             })
 
     res = pd.DataFrame(results)
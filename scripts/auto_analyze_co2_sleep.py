@@ -16,6 +16,10 @@ import matplotlib.pyplot as plt
 from scipy.stats import linregress, t
 from pathlib import Path
 
+from data_quality import exclude_flagged_nights, QA_FILENAME
+from dependence import DependenceCache
+from co2_drift import build_baseline, apply_drift_correction, RAW_CO2_FILENAME, BASELINE_FILENAME
+
 # --------------------- Configuration --------------------- #
 CO2_FILENAME = "co2_history_cleaned.csv"
 OURA_FILENAME = "oura_trends.csv"
@@ -34,7 +38,7 @@ def resolve_data_directory(user_dir: str | None) -> Path:
         sys.exit(f"❌ Data directory not found: {path}")
     return path
 
-def load_and_prepare_co2(path: Path) -> pd.DataFrame:
+def load_and_prepare_co2(path: Path, baseline: pd.DataFrame | None = None) -> pd.DataFrame:
     SLEEP_END_HOUR = 7  # filter from 23:00 to 03:00
 
     df = pd.read_csv(path)
@@ -51,6 +55,10 @@ def load_and_prepare_co2(path: Path) -> pd.DataFrame:
     # Shift timestamp back to assign CO₂ to the correct night
     df['night_date'] = (df['local_ts'] - pd.Timedelta(hours=NIGHT_SHIFT_HOURS)).dt.date
 
+    # Remove SCD40 baseline drift before aggregating (see co2_drift.py)
+    if baseline is not None:
+        df = apply_drift_correction(df, baseline)
+
     return df.groupby('night_date').agg(
         avg_co2=('state', 'mean'),
         max_co2=('state', 'max'),
@@ -67,6 +75,7 @@ def load_and_prepare_oura(path: Path) -> pd.DataFrame:
 def analyze_correlations(nightly: pd.DataFrame, oura: pd.DataFrame) -> pd.DataFrame:
     results = []
     numeric_cols = oura.select_dtypes(include='number').columns
+    dependence = DependenceCache(pd.merge(oura, nightly, on='date', how='inner'))
 
     for col in numeric_cols:
         merged = pd.merge(oura[['date', col]], nightly, on='date', how='inner').dropna()
@@ -84,7 +93,8 @@ def analyze_correlations(nightly: pd.DataFrame, oura: pd.DataFrame) -> pd.DataFr
             'p-value': round(p_value, 4),
             'Slope': round(slope, 3),
             'CI Lower': round(ci_low, 3),
-            'CI Upper': round(ci_high, 3)
+            'CI Upper': round(ci_high, 3),
+            **dependence.measures('avg_co2', col)
         })
 
     df = pd.DataFrame(results)
@@ -127,6 +137,10 @@ def plot_strongest_correlation(summary: pd.DataFrame, nightly: pd.DataFrame, our
 def main():
     parser = argparse.ArgumentParser(description="Analyze nightly CO₂ vs Oura sleep metrics")
     parser.add_argument("--data-dir", help="Path to your data folder")
+    parser.add_argument("--include-flagged", action="store_true",
+                        help=f"Keep nights flagged in {QA_FILENAME} (run data_quality.py first)")
+    parser.add_argument("--drift-correct", action="store_true",
+                        help=f"Subtract the SCD40 baseline drift estimated from {RAW_CO2_FILENAME}")
     args = parser.parse_args()
 
     data_dir = resolve_data_directory(args.data_dir)
@@ -139,7 +153,17 @@ def main():
         sys.exit(f"❌ Missing file: {oura_path}")
 
     print(f"📂 Using data from: {data_dir}")
-    nightly = load_and_prepare_co2(co2_path)
+    baseline = None
+    if args.drift_correct:
+        raw_path = data_dir / RAW_CO2_FILENAME
+        if not raw_path.exists():
+            sys.exit(f"❌ Missing file: {raw_path}")
+        baseline = build_baseline(raw_path, data_dir / BASELINE_FILENAME)
+        print(f"📉 Drift correction: mean offset {baseline['offset_ppm'].mean():.1f} ppm over {len(baseline)} days")
+
+    nightly = load_and_prepare_co2(co2_path, baseline)
+    if not args.include_flagged:
+        nightly = exclude_flagged_nights(nightly, data_dir / QA_FILENAME, "co2")
     oura = load_and_prepare_oura(oura_path)
 
     summary = analyze_correlations(nightly, oura)
@@ -13,6 +13,9 @@ import pandas as pd
 from scipy.stats import pearsonr
 from pathlib import Path
 
+from dependence import DependenceCache
+from data_quality import exclude_flagged_nights, sensor_name_from_path, QA_FILENAME
+
 # --- Configuration --- #
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 SENSOR_FILE = "co2_history_cleaned.csv"
@@ -21,6 +24,7 @@ TIMEZONE = "Europe/Helsinki"
 SLEEP_START_HOUR = 23
 SLEEP_END_HOUR = 7
 NIGHT_SHIFT_HOURS = 7
+EXCLUDE_FLAGGED_NIGHTS = True  # drop nights flagged in qa_nights.csv (see data_quality.py)
 
 
 def load_sensor_data(path: Path) -> pd.DataFrame:
@@ -48,6 +52,7 @@ def load_oura_data(path: Path) -> pd.DataFrame:
 
 def compute_correlations(nightly: pd.DataFrame, oura: pd.DataFrame) -> pd.DataFrame:
     merged = pd.merge(nightly, oura, on='date')
+    dependence = DependenceCache(merged)
     results = []
 
     for col in merged.select_dtypes(include='number').columns:
@@ -60,7 +65,8 @@ def compute_correlations(nightly: pd.DataFrame, oura: pd.DataFrame) -> pd.DataFr
                 'Metric': col,
                 'N': len(x),
                 'Pearson r': round(r, 3),
-                'p-value': round(p, 4)
+                'p-value': round(p, 4),
+                **dependence.measures('avg_sensor', col)
             })
 
     return pd.DataFrame(results).sort_values(by='p-value', key=lambda x: x.abs(), ascending=False)
@@ -79,6 +85,8 @@ def main():
     print(f"📈 Sensor file: {SENSOR_FILE}")
 
     sensor_df = load_sensor_data(sensor_path)
+    if EXCLUDE_FLAGGED_NIGHTS:
+        sensor_df = exclude_flagged_nights(sensor_df, DATA_DIR / QA_FILENAME, sensor_name_from_path(sensor_path))
     oura_df = load_oura_data(oura_path)
 
     summary = compute_correlations(sensor_df, oura_df)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+co2_drift.py
+
+Estimates and corrects the slow baseline drift of the SCD40 CO₂ sensor.
+
+The SCD40 is accurate to ±(50 ppm + 5%) and its automatic self-calibration
+lets the baseline wander over months. Daytime readings regularly reach
+ventilated, near-outdoor levels, so a low rolling percentile of daytime CO₂
+tracks the sensor baseline. The difference to the outdoor reference is
+subtracted from the readings before nightly aggregation. Until the window
+holds MIN_WINDOW_DAYS days of data the baseline is left empty and the
+offset is 0, so a handful of early readings can't set it.
+
+The window slides a day at a time over per-day sorted blocks: all
+readings are sorted once by (day, value), and the window is kept as one
+sorted array. Each new day's block is merged in with `np.searchsorted`
+(O(b log w) comparisons for a block of b readings) and the day leaving
+the window is removed the same way. The quantile is then read by index,
+so no reading is sorted or selected more than once. The daily baseline
+is cached to `co2_baseline.csv` so later runs only recompute the last
+cached day and extend it with new ones.
+
+Author: Your Name
+"""
+
+import sys
+import argparse
+import math
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# --------------------- Configuration --------------------- #
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+RAW_CO2_FILENAME = "co2_history.csv"
+BASELINE_FILENAME = "co2_baseline.csv"
+TIMEZONE = "Europe/Helsinki"
+
+DAY_START_HOUR = 9
+DAY_END_HOUR = 21
+BASELINE_QUANTILE = 0.05
+BASELINE_WINDOW_DAYS = 14
+MIN_WINDOW_DAYS = 7            # days with daytime data needed before a baseline is trusted
+OFFSET_MAX_AGE_DAYS = 14       # don't carry an offset across longer data gaps
+OUTDOOR_CO2_PPM = 420
+
+# --------------------- Baseline --------------------- #
+
+def load_daytime_co2(path: Path, since: pd.Timestamp | None = None) -> pd.DataFrame:
+    df = pd.read_csv(path, usecols=['state', 'last_changed'])
+    df['last_changed'] = pd.to_datetime(df['last_changed'], utc=True, errors='coerce', format='ISO8601')
+    df['state'] = pd.to_numeric(df['state'], errors='coerce')
+    df = df.dropna(subset=['last_changed', 'state'])
+
+    df['local_ts'] = df['last_changed'].dt.tz_convert(TIMEZONE)
+    hour = df['local_ts'].dt.hour
+    df = df[(hour >= DAY_START_HOUR) & (hour < DAY_END_HOUR)]
+    if since is not None:
+        df = df[df['local_ts'] >= since]
+    df = df.sort_values('local_ts')
+    df['date'] = df['local_ts'].dt.date
+    return df[['local_ts', 'date', 'state']]
+
+def remove_sorted(window: np.ndarray, block: np.ndarray) -> np.ndarray:
+    """Deletes the sorted values of `block` (all present in `window`) from sorted `window`."""
+    # Equal values map to consecutive slots: offset each by its position in its run of ties
+    tie_offset = np.arange(len(block)) - np.searchsorted(block, block, side='left')
+    return np.delete(window, np.searchsorted(window, block, side='left') + tie_offset)
+
+def rolling_baseline(daytime: pd.DataFrame, start=None) -> pd.DataFrame:
+    """Quantile of the last BASELINE_WINDOW_DAYS days of readings, one value per day from `start`."""
+    values = daytime['state'].to_numpy(dtype=float)
+    dates = pd.to_datetime(daytime['date']).to_numpy()
+    days, day_idx = np.unique(dates, return_inverse=True)
+    order = np.lexsort((values, day_idx))
+    blocks = np.split(values[order], np.flatnonzero(np.diff(day_idx[order])) + 1) if len(values) else []
+
+    # Oldest day still inside the window ending on day i
+    oldest = np.searchsorted(days, days - np.timedelta64(BASELINE_WINDOW_DAYS - 1, 'D'))
+    window = np.empty(0)
+    lo = 0
+    rows = []
+    for i, block in enumerate(blocks):
+        while lo < oldest[i]:
+            window = remove_sorted(window, blocks[lo])
+            lo += 1
+        window = np.insert(window, np.searchsorted(window, block), block)
+        if start is not None and days[i] < np.datetime64(start):
+            continue
+        baseline = np.nan
+        if i - lo + 1 >= MIN_WINDOW_DAYS:
+            baseline = float(window[max(1, math.ceil(BASELINE_QUANTILE * len(window))) - 1])
+        rows.append((pd.Timestamp(days[i]).date(), baseline, len(window)))
+
+    return pd.DataFrame(rows, columns=['date', 'baseline_ppm', 'window_readings'])
+
+def build_baseline(raw_path: Path, cache_path: Path | None = None, rebuild: bool = False) -> pd.DataFrame:
+    """Returns the daily baseline, extending the cached series when present."""
+    cached = None
+    if cache_path is not None and cache_path.exists() and not rebuild:
+        cached = pd.read_csv(cache_path)
+        cached['date'] = pd.to_datetime(cached['date']).dt.date
+
+    if cached is not None and not cached.empty:
+        # The last cached day may have been exported mid-day, so it is recomputed too
+        last = cached['date'].max()
+        since = pd.Timestamp(last, tz=TIMEZONE) - pd.Timedelta(days=BASELINE_WINDOW_DAYS - 1)
+        new = rolling_baseline(load_daytime_co2(raw_path, since), start=last)
+        baseline = pd.concat([cached[cached['date'] < last], new], ignore_index=True)
+    else:
+        new = rolling_baseline(load_daytime_co2(raw_path))
+        baseline = new
+
+    # No correction until the window is filled
+    baseline['offset_ppm'] = (baseline['baseline_ppm'] - OUTDOOR_CO2_PPM).round(1).fillna(0.0)
+    if cache_path is not None and (cached is None or not new.empty):
+        baseline.to_csv(cache_path, index=False)
+    return baseline
+
+def apply_drift_correction(df: pd.DataFrame, baseline: pd.DataFrame,
+                           date_col: str = 'night_date', value_col: str = 'state') -> pd.DataFrame:
+    """Subtracts the latest baseline offset known on each reading's date (0 when it is too old)."""
+    df = df.copy()
+    keys = pd.to_datetime(df[date_col])
+    offsets = baseline[['date', 'offset_ppm']].copy()
+    offsets['date'] = pd.to_datetime(offsets['date'])
+    offsets = offsets.sort_values('date')
+
+    order = np.argsort(keys.to_numpy(), kind='stable')
+    matched = pd.merge_asof(
+        pd.DataFrame({'date': keys.to_numpy()[order], 'pos': order}),
+        offsets, on='date', direction='backward', tolerance=pd.Timedelta(days=OFFSET_MAX_AGE_DAYS)
+    )
+    offset = np.zeros(len(df))
+    offset[matched['pos'].to_numpy()] = matched['offset_ppm'].fillna(0).to_numpy()
+    df[value_col] = df[value_col] - offset
+    return df
+
+# --------------------- Main --------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate SCD40 CO₂ baseline drift")
+    parser.add_argument("--data-dir", help="Path to your data folder")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the cached baseline and recompute")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).expanduser().resolve() if args.data_dir else DATA_DIR
+    raw_path = data_dir / RAW_CO2_FILENAME
+    if not raw_path.exists():
+        sys.exit(f"❌ Missing file: {raw_path}")
+
+    print(f"📂 Using data from: {data_dir}")
+    baseline = build_baseline(raw_path, data_dir / BASELINE_FILENAME, rebuild=args.rebuild)
+    if baseline.empty:
+        sys.exit("❌ No daytime CO₂ readings to estimate a baseline from.")
+
+    print(f"\n📉 Daily baseline (p{BASELINE_QUANTILE * 100:g}, {BASELINE_WINDOW_DAYS}-day window):")
+    print(f" - Days: {len(baseline)} ({baseline['date'].min()} → {baseline['date'].max()})")
+    print(f" - Baseline range: {baseline['baseline_ppm'].min():.0f} → {baseline['baseline_ppm'].max():.0f} ppm")
+    print(f" - Offset vs {OUTDOOR_CO2_PPM} ppm: mean {baseline['offset_ppm'].mean():.1f}, "
+          f"latest {baseline['offset_ppm'].iloc[-1]:.1f} ppm")
+    print(f"✅ Baseline saved to: {data_dir / BASELINE_FILENAME}")
+
+
+if __name__ == "__main__":
+    main()
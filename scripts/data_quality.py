@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+data_quality.py
+
+Vectorized data-quality scanner for raw Home Assistant sensor exports.
+Loads every `*_history.csv` in the data folder in one go and computes, per
+entity and night:
+- Readings and `unknown`/`unavailable` states inside the sleep window
+- Gap runs (time between consecutive rows above GAP_MINUTES)
+- Flat-line runs (identical values held for a long time, e.g. a stuck SCD40)
+- Rolling-median outliers (spikes)
+- Coverage of the sleep window
+
+Writes the result as a QA table (`qa_nights.csv`) that the analyzers use to
+exclude flagged nights.
+
+Author: Your Name
+"""
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# --------------------- Configuration --------------------- #
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+HISTORY_PATTERN = "*_history.csv"
+QA_FILENAME = "qa_nights.csv"
+TIMEZONE = "Europe/Helsinki"
+
+SLEEP_START_HOUR = 23
+SLEEP_END_HOUR = 7
+NIGHT_SHIFT_HOURS = 7
+
+GAP_MINUTES = 90           # hourly statistics are normal, anything longer is a gap
+FLAT_MINUTES = 180         # same value held this long looks like a stuck sensor
+SPIKE_WINDOW = 9           # rolling median window (readings, centered)
+SPIKE_MAD_FACTOR = 5.0     # |value - median| > factor * MAD → spike
+MIN_COVERAGE = 0.6         # fraction of the sleep window covered by readings
+MIN_READINGS_PER_NIGHT = 5
+MAX_SPIKES_PER_NIGHT = 3
+
+# --------------------- Loading --------------------- #
+
+def sensor_name_from_path(path: Path) -> str:
+    return path.name.split("_history")[0]
+
+def load_raw_history(paths: list[Path]) -> pd.DataFrame:
+    """Concatenates raw exports, keeping non-numeric states for QA."""
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path, usecols=['entity_id', 'state', 'last_changed'])
+        df['sensor'] = sensor_name_from_path(path)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+
+    df['last_changed'] = pd.to_datetime(df['last_changed'], utc=True, errors='coerce', format='ISO8601')
+    df = df.dropna(subset=['last_changed'])
+    df['value'] = pd.to_numeric(df['state'], errors='coerce')
+    return df.sort_values(['entity_id', 'last_changed'], kind='stable').reset_index(drop=True)
+
+# --------------------- Scanning --------------------- #
+
+def annotate_readings(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds per-row QA columns in one vectorized pass over all entities."""
+    df = df.copy()
+    entity = df['entity_id']
+    new_entity = entity.ne(entity.shift())
+
+    # Time until the next row of the same entity (NaN at the end of each series)
+    next_ts = df['last_changed'].shift(-1).where(~new_entity.shift(-1, fill_value=True))
+    df['dt_next_min'] = (next_ts - df['last_changed']).dt.total_seconds() / 60
+    df['is_gap'] = df['dt_next_min'] > GAP_MINUTES
+    df['unavailable'] = df['value'].isna()
+
+    # Flat-line runs: consecutive identical numeric values of the same entity
+    numeric = df['value']
+    changed = new_entity | numeric.ne(numeric.shift()) | numeric.isna()
+    run_id = changed.cumsum()
+    run_end = df['last_changed'] + pd.to_timedelta(df['dt_next_min'].fillna(0), unit='min')
+    run_start = df.groupby(run_id)['last_changed'].transform('min')
+    run_stop = run_end.groupby(run_id).transform('max')
+    df['flat_run_min'] = ((run_stop - run_start).dt.total_seconds() / 60).where(numeric.notna(), 0.0)
+
+    # Rolling-median outliers, using a rolling MAD as the scale
+    valid = df[numeric.notna()]
+    grouped = valid.groupby('entity_id')['value']
+    median = grouped.transform(lambda s: s.rolling(SPIKE_WINDOW, center=True, min_periods=3).median())
+    abs_dev = (valid['value'] - median).abs()
+    mad = abs_dev.groupby(valid['entity_id']).transform(
+        lambda s: s.rolling(SPIKE_WINDOW, center=True, min_periods=3).median()
+    )
+    spike = abs_dev > SPIKE_MAD_FACTOR * 1.4826 * mad.replace(0, np.nan)
+    df['is_spike'] = spike.reindex(df.index, fill_value=False)
+
+    # Night assignment
+    local_ts = df['last_changed'].dt.tz_convert(TIMEZONE)
+    hour = local_ts.dt.hour
+    df['in_window'] = (hour >= SLEEP_START_HOUR) | (hour < SLEEP_END_HOUR)
+    df['night_date'] = (local_ts - pd.Timedelta(hours=NIGHT_SHIFT_HOURS)).dt.date
+    return df
+
+def gap_overlaps(df: pd.DataFrame) -> pd.DataFrame:
+    """Clips every outage interval to each sleep window it overlaps, one row per (outage, night)."""
+    window_hours = (SLEEP_END_HOUR - SLEEP_START_HOUR) % 24
+    window_offset = pd.Timedelta(hours=(SLEEP_START_HOUR - NIGHT_SHIFT_HOURS) % 24)
+    shift = pd.Timedelta(hours=NIGHT_SHIFT_HOURS)
+
+    # A gap is a long silence, or time spent in an unknown/unavailable state;
+    # consecutive gap rows of one entity are merged so a burst of states is one outage
+    outage = df['is_gap'] | (df['unavailable'] & df['dt_next_min'].notna())
+    new_entity = df['entity_id'].ne(df['entity_id'].shift())
+    outage_id = (outage & (new_entity | ~outage.shift(fill_value=False))).cumsum()
+    rows = df[outage].assign(
+        end_utc=df['last_changed'] + pd.to_timedelta(df['dt_next_min'], unit='min'),
+    )
+    gaps = rows.groupby(outage_id[outage]).agg(
+        sensor=('sensor', 'first'),
+        entity_id=('entity_id', 'first'),
+        start_utc=('last_changed', 'min'),
+        end_utc=('end_utc', 'max'),
+    )
+    start_utc, end_utc = gaps['start_utc'], gaps['end_utc']
+    # Night-shifted local wall time: night d's window is [d + offset, d + offset + window)
+    s0 = start_utc.dt.tz_convert(TIMEZONE).dt.tz_localize(None) - shift
+    s1 = end_utc.dt.tz_convert(TIMEZONE).dt.tz_localize(None) - shift
+
+    first = s0.dt.floor('D') - pd.Timedelta(days=1)
+    n_nights = ((s1.dt.floor('D') - first).dt.days + 1).to_numpy()
+    rep = np.repeat(np.arange(len(gaps)), n_nights)
+    step = np.arange(len(rep)) - np.repeat(np.cumsum(n_nights) - n_nights, n_nights)
+
+    night = first.to_numpy()[rep] + step * np.timedelta64(1, 'D')
+    win_start = night + window_offset.to_timedelta64()
+    win_end = win_start + np.timedelta64(window_hours, 'h')
+    lo = np.maximum(s0.to_numpy()[rep], win_start)
+    hi = np.minimum(s1.to_numpy()[rep], win_end)
+    overlap_min = (hi - lo) / np.timedelta64(1, 'm')
+
+    keep = overlap_min > 0
+    return pd.DataFrame({
+        'sensor': gaps['sensor'].to_numpy()[rep][keep],
+        'entity_id': gaps['entity_id'].to_numpy()[rep][keep],
+        'night_date': pd.DatetimeIndex(night[keep]).date,
+        'gap_min': overlap_min[keep],
+    })
+
+def summarize_nights(df: pd.DataFrame) -> pd.DataFrame:
+    """Aggregates annotated readings to one QA row per entity and night."""
+    keys = ['sensor', 'entity_id', 'night_date']
+    window_hours = (SLEEP_END_HOUR - SLEEP_START_HOUR) % 24
+    window = df[df['in_window']]
+
+    qa = window.groupby(keys).agg(
+        readings=('value', 'count'),
+        unavailable=('unavailable', 'sum'),
+        max_flat_min=('flat_run_min', 'max'),
+        spikes=('is_spike', 'sum'),
+    )
+    gaps = gap_overlaps(df).groupby(keys).agg(
+        gaps=('gap_min', 'size'),
+        max_gap_min=('gap_min', 'max'),
+        uncovered_min=('gap_min', 'sum'),
+    )
+    qa = qa.join(gaps, how='outer')
+
+    # Nights without a single reading still belong in the table
+    full_index = [
+        (sensor, entity, night)
+        for (sensor, entity), nights in qa.reset_index().groupby(['sensor', 'entity_id'])['night_date']
+        for night in pd.date_range(nights.min(), nights.max(), freq='D').date
+    ]
+    qa = qa.reindex(pd.MultiIndex.from_tuples(full_index, names=keys)).fillna(0)
+    int_cols = ['readings', 'unavailable', 'spikes', 'gaps']
+    qa[int_cols] = qa[int_cols].astype(int)
+
+    qa = qa.reset_index()
+    qa['coverage'] = (1 - qa['uncovered_min'] / (window_hours * 60)).clip(lower=0, upper=1).round(3)
+    qa = qa.drop(columns='uncovered_min')
+    qa['max_gap_min'] = qa['max_gap_min'].round(1)
+    qa['max_flat_min'] = qa['max_flat_min'].round(1)
+
+    reasons = pd.DataFrame({
+        'low_coverage': qa['coverage'] < MIN_COVERAGE,
+        'few_readings': qa['readings'] < MIN_READINGS_PER_NIGHT,
+        'flat_line': qa['max_flat_min'] >= FLAT_MINUTES,
+        'spikes': qa['spikes'] > MAX_SPIKES_PER_NIGHT,
+    })
+    qa['flagged'] = reasons.any(axis=1)
+    qa['reasons'] = reasons.apply(lambda col: np.where(col, col.name + ';', '')).sum(axis=1).str.rstrip(';')
+    return qa
+
+def scan_quality(paths: list[Path]) -> pd.DataFrame:
+    return summarize_nights(annotate_readings(load_raw_history(paths)))
+
+# --------------------- Analyzer Helpers --------------------- #
+
+def load_flagged_nights(qa_path: Path, sensor: str) -> set:
+    """Returns the nights flagged for a sensor, or an empty set without a QA table."""
+    if not qa_path.exists():
+        return set()
+    qa = pd.read_csv(qa_path)
+    qa = qa[(qa['sensor'] == sensor) & qa['flagged']]
+    return set(pd.to_datetime(qa['night_date']).dt.date)
+
+def exclude_flagged_nights(nightly: pd.DataFrame, qa_path: Path, sensor: str, date_col: str = 'date') -> pd.DataFrame:
+    flagged = load_flagged_nights(qa_path, sensor)
+    if not flagged:
+        return nightly
+    keep = ~nightly[date_col].isin(flagged)
+    print(f"🚩 Excluding {nightly.loc[~keep, date_col].nunique()} QA-flagged {sensor} nights")
+    return nightly[keep]
+
+# --------------------- Main --------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan raw sensor history for data-quality issues")
+    parser.add_argument("--data-dir", help="Path to your data folder")
+    parser.add_argument("--output", help="QA table path (default: <data-dir>/qa_nights.csv)")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).expanduser().resolve() if args.data_dir else DATA_DIR
+    paths = sorted(data_dir.glob(HISTORY_PATTERN))
+    if not paths:
+        sys.exit(f"❌ No {HISTORY_PATTERN} files found in: {data_dir}")
+
+    print(f"📂 Using data from: {data_dir}")
+    print(f"📈 Files: {', '.join(p.name for p in paths)}")
+
+    qa = scan_quality(paths)
+    output_path = Path(args.output) if args.output else data_dir / QA_FILENAME
+    qa.to_csv(output_path, index=False)
+
+    print("\n📊 QA Summary per sensor:")
+    summary = qa.groupby('sensor').agg(
+        nights=('night_date', 'count'),
+        flagged=('flagged', 'sum'),
+        median_coverage=('coverage', 'median'),
+        unavailable=('unavailable', 'sum'),
+        gaps=('gaps', 'sum'),
+        spikes=('spikes', 'sum'),
+    )
+    print(summary.to_string())
+    print(f"\n✅ QA table saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+dependence.py
+
+Rank-based and nonlinear dependence measures for the correlation summaries:
+- Spearman ρ (Pearson on cached ranks)
+- Kendall τ-b (scipy's O(n log n) merge-sort algorithm, fed the cached ranks)
+- Distance correlation (captures non-monotonic relationships), computed in
+  O(n log² n) time and O(n) memory from sorted prefix sums, after Huo &
+  Székely (2016), without ever building the n × n distance matrices
+  (their O(n log n) bound needs a merge pass; here each of the log n
+  levels does one vectorized sort instead)
+- Mutual information (binned, equal-frequency bins taken from the ranks)
+
+`DependenceCache` ranks each column once over its non-missing nights and
+only re-ranks when a pair's missing nights drop rows from it. The per-column
+distance terms (row sums, distance variance) are O(n) and cached the same
+way, so the extra measures only add a small cost per pair.
+
+Author: Your Name
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata, kendalltau
+
+# --------------------- Configuration --------------------- #
+
+MEASURE_COLUMNS = ['Spearman ρ', 'Kendall τ', 'dCor', 'MI']
+
+# --------------------- Measures --------------------- #
+
+def pearson_from_arrays(x: np.ndarray, y: np.ndarray) -> float:
+    xc, yc = x - x.mean(), y - y.mean()
+    denom = np.sqrt((xc @ xc) * (yc @ yc))
+    return float(xc @ yc / denom) if denom > 0 else np.nan
+
+def distance_row_sums(x: np.ndarray) -> np.ndarray:
+    """Σ_j |x_i − x_j| for every i, from prefix sums over the sorted values."""
+    n = len(x)
+    order = np.argsort(x, kind='stable')
+    xs = x[order]
+    before = np.cumsum(xs) - xs
+    sums = np.empty(n)
+    sums[order] = xs * (2 * np.arange(n) - n) + xs.sum() - 2 * before
+    return sums
+
+def cross_distance_sum(x: np.ndarray, y: np.ndarray) -> float:
+    """Σ_ij |x_i − x_j| · |y_i − y_j| in O(n log² n).
+
+    With points sorted by x, each pair i < j contributes ±(x_j − x_i)(y_j − y_i),
+    positive when y_i < y_j. The sums over earlier points with a smaller y are
+    dominance counts, collected level by level as in a bottom-up merge sort;
+    each of the log n levels re-sorts by (block, y) with one `np.lexsort`.
+    """
+    n = len(x)
+    order = np.argsort(x, kind='stable')
+    xs, ys = x[order], y[order]
+    y_rank = np.argsort(np.argsort(ys, kind='stable'), kind='stable')
+    terms = np.vstack([np.ones(n), xs, ys, xs * ys])
+
+    idx = np.arange(n)
+    lower = np.zeros_like(terms)
+    size = 1
+    while size < n:
+        block = idx // (2 * size)
+        right = (idx // size) % 2 == 1
+        perm = np.lexsort((y_rank, block))
+        running = np.concatenate([np.zeros((4, 1)), np.cumsum(np.where(right[perm], 0.0, terms[:, perm]), axis=1)], axis=1)
+        block_start = np.searchsorted(block[perm], block[perm])
+        inside = running[:, 1:] - running[:, block_start]
+        lower[:, perm[right[perm]]] += inside[:, right[perm]]
+        size *= 2
+    earlier = np.cumsum(terms, axis=1) - terms
+
+    def pair_sum(c):
+        return xs * ys * c[0] - xs * c[2] - ys * c[1] + c[3]
+
+    return float(2 * (2 * pair_sum(lower) - pair_sum(earlier)).sum())
+
+def distance_terms(x: np.ndarray) -> tuple[np.ndarray, float]:
+    """Row sums of |x_i − x_j| and the (V-statistic) distance variance."""
+    n = len(x)
+    rows = distance_row_sums(x)
+    xc = x - x.mean()
+    squares = 2 * n * (xc @ xc)            # Σ_ij (x_i − x_j)²
+    dvar = squares / n**2 - 2 * (rows @ rows) / n**3 + rows.sum() ** 2 / n**4
+    return rows, dvar
+
+def distance_correlation(x: np.ndarray, y: np.ndarray, x_terms=None, y_terms=None) -> float:
+    """Distance correlation without the n × n matrices; pass cached `distance_terms` to skip recomputing them."""
+    n = len(x)
+    rx, vx = x_terms if x_terms is not None else distance_terms(x)
+    ry, vy = y_terms if y_terms is not None else distance_terms(y)
+    dcov = cross_distance_sum(x, y) / n**2 - 2 * (rx @ ry) / n**3 + rx.sum() * ry.sum() / n**4
+    dvar = np.sqrt(max(vx, 0) * max(vy, 0))
+    return float(np.sqrt(max(dcov, 0) / dvar)) if dvar > 0 else np.nan
+
+def binned_mutual_information(rx: np.ndarray, ry: np.ndarray) -> float:
+    """MI (nats) on an equal-frequency grid derived from ranks."""
+    n = len(rx)
+    bins = int(np.clip(np.cbrt(n), 2, 10))
+    bx = np.minimum(((rx - 1) * bins / n).astype(int), bins - 1)
+    by = np.minimum(((ry - 1) * bins / n).astype(int), bins - 1)
+    joint = np.bincount(bx * bins + by, minlength=bins * bins).reshape(bins, bins) / n
+    px, py = joint.sum(axis=1), joint.sum(axis=0)
+    nz = joint > 0
+    return float((joint[nz] * np.log(joint[nz] / np.outer(px, py)[nz])).sum())
+
+# --------------------- Cache --------------------- #
+
+class DependenceCache:
+    """Per-column ranks and distance terms over one merged nightly table."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._values = {}
+        self._ranks = {}
+        self._distances = {}
+
+    def _column(self, col: str) -> np.ndarray:
+        if col not in self._values:
+            self._values[col] = self.df[col].to_numpy(dtype=float)
+        return self._values[col]
+
+    def _key(self, col: str, mask: np.ndarray) -> tuple:
+        # Rows the pair keeps from this column; None when it keeps all non-missing ones
+        if mask.sum() == np.count_nonzero(~np.isnan(self._column(col))):
+            return col, None
+        return col, mask.tobytes()
+
+    def ranks(self, col: str, mask: np.ndarray) -> np.ndarray:
+        key = self._key(col, mask)
+        if key not in self._ranks:
+            self._ranks[key] = rankdata(self._column(col)[mask])
+        return self._ranks[key]
+
+    def distances(self, col: str, mask: np.ndarray) -> tuple[np.ndarray, float]:
+        key = self._key(col, mask)
+        if key not in self._distances:
+            self._distances[key] = distance_terms(self._column(col)[mask])
+        return self._distances[key]
+
+    def measures(self, x_col: str, y_col: str) -> dict:
+        x, y = self._column(x_col), self._column(y_col)
+        mask = ~np.isnan(x) & ~np.isnan(y)
+        if mask.sum() < 3:
+            return dict.fromkeys(MEASURE_COLUMNS, np.nan)
+
+        rx, ry = self.ranks(x_col, mask), self.ranks(y_col, mask)
+        tau = kendalltau(rx, ry).statistic
+        dcor = distance_correlation(x[mask], y[mask], self.distances(x_col, mask), self.distances(y_col, mask))
+        return {
+            'Spearman ρ': round(pearson_from_arrays(rx, ry), 3),
+            'Kendall τ': round(float(tau), 3),
+            'dCor': round(dcor, 3),
+            'MI': round(binned_mutual_information(rx, ry), 3),
+        }
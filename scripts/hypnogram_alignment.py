@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+hypnogram_alignment.py
+
+Epoch-level alignment of CO₂ with Oura 5-minute hypnograms.
+
+Oura's per-night sleep phase string (one character per 5-minute epoch:
+1 = deep, 2 = light, 3 = REM, 4 = awake) is decoded into an int8 matrix
+(nights × epochs) with a single vectorized byte decode. Each epoch is placed
+on the timeline from `Bedtime Start`, CO₂ is interpolated onto the epoch
+times, and the script reports:
+- CO₂ statistics per sleep stage (overall and per night)
+- Stage-transition probabilities binned by CO₂ level
+
+Everything runs on flat NumPy arrays, without Python loops over nights or
+epochs.
+
+Note: the Oura Cloud Trends CSV does not include the hypnogram. Export it
+from the Oura API (`sleep_phase_5_min`) and add it as a column to the Oura
+file.
+
+Author: Your Name
+"""
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# --------------------- Configuration --------------------- #
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CO2_FILENAME = "co2_history.csv"
+OURA_FILENAME = "oura_trends.csv"
+HYPNOGRAM_COLUMNS = ["Sleep Phase 5 Min", "sleep_phase_5_min", "Hypnogram"]
+BEDTIME_COLUMN = "Bedtime Start"
+
+EPOCH_MINUTES = 5
+MAX_STALENESS_MINUTES = 90   # no CO₂ value for epochs further than this from any reading
+STAGES = {1: "deep", 2: "light", 3: "rem", 4: "awake"}
+CO2_BINS = [600, 700, 800, 1000]   # bin edges (ppm) for transition probabilities
+
+# --------------------- Decoding --------------------- #
+
+def find_hypnogram_column(columns) -> str | None:
+    return next((c for c in HYPNOGRAM_COLUMNS if c in columns), None)
+
+def decode_hypnograms(strings: pd.Series) -> np.ndarray:
+    """Decodes phase strings into an int8 matrix, -1 marking padding/invalid epochs."""
+    s = strings.fillna("").astype(str)
+    width = int(s.str.len().max()) if len(s) else 0
+    if width == 0:
+        return np.full((len(s), 0), -1, dtype=np.int8)
+
+    raw = np.frombuffer(s.str.ljust(width).str.cat().encode('ascii'), dtype=np.uint8)
+    codes = raw.reshape(len(s), width).astype(np.int16) - ord('0')
+    valid = np.isin(codes, list(STAGES))
+    return np.where(valid, codes, -1).astype(np.int8)
+
+# --------------------- Alignment --------------------- #
+
+def load_co2(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    df = pd.read_csv(path, usecols=['state', 'last_changed'])
+    df['last_changed'] = pd.to_datetime(df['last_changed'], utc=True, errors='coerce', format='ISO8601')
+    df['state'] = pd.to_numeric(df['state'], errors='coerce')
+    df = df.dropna(subset=['last_changed', 'state']).sort_values('last_changed')
+    return df['last_changed'].to_numpy(dtype='datetime64[ns]').astype(np.int64), df['state'].to_numpy(dtype=float)
+
+def epoch_times(bedtime_start: pd.Series, n_epochs: int) -> np.ndarray:
+    start = pd.to_datetime(bedtime_start, utc=True, errors='coerce').to_numpy(dtype='datetime64[ns]')
+    step = np.int64(EPOCH_MINUTES * 60 * 1_000_000_000)
+    # Epoch midpoints, nights × epochs (NaT rows stay invalid through the staleness check)
+    return start.astype(np.int64)[:, None] + step // 2 + step * np.arange(n_epochs, dtype=np.int64)[None, :]
+
+def align_co2(times: np.ndarray, co2_ts: np.ndarray, co2_values: np.ndarray) -> np.ndarray:
+    """Interpolates CO₂ onto epoch times; NaN where the nearest reading is too far away."""
+    flat = times.ravel()
+    values = np.interp(flat, co2_ts, co2_values)
+
+    idx = np.searchsorted(co2_ts, flat)
+    prev_gap = flat - co2_ts[np.clip(idx - 1, 0, len(co2_ts) - 1)]
+    next_gap = co2_ts[np.clip(idx, 0, len(co2_ts) - 1)] - flat
+    nearest = np.minimum(np.where(idx > 0, prev_gap, np.iinfo(np.int64).max),
+                         np.where(idx < len(co2_ts), next_gap, np.iinfo(np.int64).max))
+    max_gap = MAX_STALENESS_MINUTES * 60 * 1_000_000_000
+    values[(np.abs(nearest) > max_gap) | (flat < 0)] = np.nan
+    return values.reshape(times.shape)
+
+# --------------------- Statistics --------------------- #
+
+def stage_co2_stats(stages: np.ndarray, co2: np.ndarray) -> pd.DataFrame:
+    mask = (stages >= 0) & ~np.isnan(co2)
+    flat = pd.DataFrame({'stage': stages[mask], 'co2': co2[mask]})
+    stats = flat.groupby('stage')['co2'].agg(['count', 'mean', 'median', 'std']).round(1)
+    stats.index = stats.index.map(STAGES)
+    return stats
+
+def nightly_stage_co2(dates: pd.Series, stages: np.ndarray, co2: np.ndarray) -> pd.DataFrame:
+    """Mean CO₂ per night and stage, via a single bincount over (night, stage)."""
+    n_nights = stages.shape[0]
+    mask = (stages >= 0) & ~np.isnan(co2)
+    night_idx = np.broadcast_to(np.arange(n_nights)[:, None], stages.shape)[mask]
+    key = night_idx * 5 + stages[mask]
+    sums = np.bincount(key, weights=co2[mask], minlength=n_nights * 5).reshape(n_nights, 5)
+    counts = np.bincount(key, minlength=n_nights * 5).reshape(n_nights, 5)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+
+    result = pd.DataFrame({f"co2_{name}": means[:, code].round(1) for code, name in STAGES.items()})
+    for code, name in STAGES.items():
+        result[f"{name}_epochs"] = counts[:, code]
+    result.insert(0, 'date', dates.to_numpy())
+    return result
+
+def transition_probabilities(stages: np.ndarray, co2: np.ndarray) -> pd.DataFrame:
+    """P(next stage | stage, CO₂ bin) from consecutive epoch pairs."""
+    src, dst = stages[:, :-1], stages[:, 1:]
+    level = co2[:, :-1]
+    mask = (src >= 0) & (dst >= 0) & ~np.isnan(level)
+
+    n_bins = len(CO2_BINS) + 1
+    bins = np.digitize(level[mask], CO2_BINS)
+    key = (bins * 5 + src[mask]) * 5 + dst[mask]
+    counts = np.bincount(key, minlength=n_bins * 25).reshape(n_bins, 5, 5)[:, 1:, 1:]
+    totals = counts.sum(axis=2, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        probs = counts / totals
+
+    edges = [-np.inf] + CO2_BINS + [np.inf]
+    labels = [f"<{edges[1]}" if i == 0 else (f"≥{edges[i]}" if i == n_bins - 1 else f"{edges[i]}–{edges[i + 1]}")
+              for i in range(n_bins)]
+    names = list(STAGES.values())
+    index = pd.MultiIndex.from_product([labels, names, names], names=['co2_bin', 'from', 'to'])
+    return pd.DataFrame({
+        'transitions': counts.ravel(),
+        'probability': probs.ravel().round(3),
+    }, index=index).reset_index()
+
+# --------------------- Main --------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Align CO₂ with Oura 5-minute hypnograms")
+    parser.add_argument("--data-dir", help="Path to your data folder")
+    parser.add_argument("--oura", default=OURA_FILENAME, help="Oura file with a hypnogram column")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).expanduser().resolve() if args.data_dir else DATA_DIR
+    co2_path, oura_path = data_dir / CO2_FILENAME, data_dir / args.oura
+    for path in (co2_path, oura_path):
+        if not path.exists():
+            sys.exit(f"❌ Missing file: {path}")
+
+    oura = pd.read_csv(oura_path)
+    column = find_hypnogram_column(oura.columns)
+    if column is None:
+        sys.exit(f"❌ No hypnogram column in {oura_path.name} (expected one of: {', '.join(HYPNOGRAM_COLUMNS)})")
+    oura = oura.dropna(subset=[column, BEDTIME_COLUMN]).reset_index(drop=True)
+
+    print(f"📂 Using data from: {data_dir}")
+    stages = decode_hypnograms(oura[column])
+    times = epoch_times(oura[BEDTIME_COLUMN], stages.shape[1])
+    co2 = align_co2(times, *load_co2(co2_path))
+    print(f"🛏️  Nights: {stages.shape[0]}, epochs/night (max): {stages.shape[1]}, "
+          f"epochs with CO₂: {int(((stages >= 0) & ~np.isnan(co2)).sum())}")
+
+    print("\n📊 CO₂ by Sleep Stage (ppm):")
+    print(stage_co2_stats(stages, co2).to_string())
+
+    dates = pd.to_datetime(oura['date'], errors='coerce').dt.date
+    nightly = nightly_stage_co2(dates, stages, co2)
+    nightly_path = data_dir / "hypnogram_stage_co2.csv"
+    nightly.to_csv(nightly_path, index=False)
+
+    transitions = transition_probabilities(stages, co2)
+    transitions_path = data_dir / "hypnogram_transitions.csv"
+    transitions.to_csv(transitions_path, index=False)
+
+    print("\n🔁 Transition probabilities out of REM by CO₂ level:")
+    rem = transitions[transitions['from'] == 'rem'].pivot(index='co2_bin', columns='to', values='probability')
+    print(rem.reindex(index=transitions['co2_bin'].unique(), columns=list(STAGES.values())).to_string())
+    print(f"\n✅ Saved: {nightly_path.name}, {transitions_path.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+nightly_dataset.py
+
+Lazy query API over nightly sensor features, shared by the scripts and notebooks:
+
+    from nightly_dataset import NightlyDataset
+
+    ds = NightlyDataset()
+    ds.sensor("co2").window(23, 3).stat("mean", "max").join("oura_trends.csv").correlate()
+
+Calls only build a plan. On execution the plan is optimized first:
+- One scan per sensor file, shared by every window/stat on that sensor
+- Hour filters pushed down into the scan (only the union of requested hours is kept;
+  a later query needing new hours rescans with the union of old and new ones)
+- One groupby per sensor/window for all requested stats
+- Aggregates and scans are cached on the dataset and reused by later queries
+
+Author: Your Name
+"""
+
+import pandas as pd
+from pathlib import Path
+from dataclasses import dataclass, replace
+from scipy.stats import linregress
+
+from dependence import DependenceCache, MEASURE_COLUMNS
+from data_quality import exclude_flagged_nights, QA_FILENAME
+from co2_drift import build_baseline, apply_drift_correction, RAW_CO2_FILENAME, BASELINE_FILENAME
+
+# --------------------- Configuration --------------------- #
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+OURA_FILENAME = "oura_trends.csv"
+TIMEZONE = "Europe/Helsinki"
+SLEEP_START_HOUR = 23
+SLEEP_END_HOUR = 7
+NIGHT_SHIFT_HOURS = 7
+MIN_NIGHTS = 10
+
+STATS = ('mean', 'max', 'min', 'median', 'std', 'count')
+
+# --------------------- Plan --------------------- #
+
+def window_hours(start: int, end: int) -> frozenset:
+    """Hours covered by a [start, end) window, wrapping over midnight."""
+    if start < end:
+        return frozenset(range(start, end))
+    return frozenset(range(start, 24)) | frozenset(range(0, end))
+
+@dataclass(frozen=True)
+class Feature:
+    sensor: str
+    start: int
+    end: int
+    stat: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.sensor}_{self.stat}_{self.start:02d}_{self.end:02d}"
+
+@dataclass(frozen=True)
+class Query:
+    dataset: 'NightlyDataset'
+    features: tuple = ()
+    cursor_sensor: str | None = None
+    cursor_window: tuple = (SLEEP_START_HOUR, SLEEP_END_HOUR)
+    oura: object = None
+
+    # ---- builders ---- #
+
+    def sensor(self, name: str) -> 'Query':
+        return replace(self, cursor_sensor=name, cursor_window=(SLEEP_START_HOUR, SLEEP_END_HOUR))
+
+    def window(self, start: int, end: int) -> 'Query':
+        return replace(self, cursor_window=(start, end))
+
+    def stat(self, *stats: str) -> 'Query':
+        if self.cursor_sensor is None:
+            raise ValueError("Select a sensor before adding stats")
+        unknown = set(stats) - set(STATS)
+        if unknown:
+            raise ValueError(f"Unknown stat(s): {', '.join(sorted(unknown))}")
+        new = tuple(Feature(self.cursor_sensor, *self.cursor_window, s) for s in stats)
+        return replace(self, features=self.features + tuple(f for f in new if f not in self.features))
+
+    def join(self, oura=OURA_FILENAME) -> 'Query':
+        """Joins Oura metrics by night; accepts a file name, a path or a DataFrame."""
+        return replace(self, oura=oura)
+
+    # ---- execution ---- #
+
+    def explain(self) -> str:
+        return self.dataset.explain(self)
+
+    def collect(self) -> pd.DataFrame:
+        nightly = self.dataset.execute(self.features)
+        if self.oura is None:
+            return nightly
+        return pd.merge(nightly, self.dataset.oura(self.oura), on='date')
+
+    def correlate(self) -> pd.DataFrame:
+        """Pearson r, slope and rank/nonlinear measures for every feature × Oura metric pair."""
+        if self.oura is None:
+            raise ValueError("Join Oura data before correlating")
+        merged = self.collect()
+        feature_cols = [f.name for f in self.features]
+        metric_cols = [c for c in self.dataset.oura(self.oura).select_dtypes(include='number').columns]
+
+        dependence = DependenceCache(merged)
+        results = []
+        for f_col in feature_cols:
+            for m_col in metric_cols:
+                pair = merged[[f_col, m_col]].dropna()
+                if len(pair) < MIN_NIGHTS or pair[f_col].nunique() < 2:
+                    continue
+                fit = linregress(pair[f_col], pair[m_col])
+                results.append({
+                    'Feature': f_col,
+                    'Metric': m_col,
+                    'N': len(pair),
+                    'Pearson r': round(fit.rvalue, 3),
+                    'p-value': round(fit.pvalue, 4),
+                    'Slope': round(fit.slope, 3),
+                    **dependence.measures(f_col, m_col),
+                })
+
+        df = pd.DataFrame(results, columns=['Feature', 'Metric', 'N', 'Pearson r', 'p-value', 'Slope'] + MEASURE_COLUMNS)
+        return df.sort_values(by='Pearson r', key=lambda x: x.abs(), ascending=False)
+
+# --------------------- Dataset --------------------- #
+
+class NightlyDataset:
+    """Entry point for lazy nightly-feature queries over one data folder."""
+
+    def __init__(self, data_dir: Path | str | None = None, prefer_cleaned: bool = True,
+                 exclude_flagged: bool = True, drift_correct: bool = False):
+        self.data_dir = Path(data_dir).expanduser().resolve() if data_dir else DATA_DIR
+        self.prefer_cleaned = prefer_cleaned
+        self.exclude_flagged = exclude_flagged
+        self.drift_correct = drift_correct
+        self._scans = {}        # sensor → (hours, readings)
+        self._aggregates = {}   # Feature → Series indexed by date
+        self._oura = {}
+
+    def sensor(self, name: str) -> Query:
+        return Query(self).sensor(name)
+
+    def sensor_file(self, sensor: str) -> Path:
+        candidates = [f"{sensor}_history_cleaned.csv", f"{sensor}_history.csv"]
+        if not self.prefer_cleaned:
+            candidates.reverse()
+        for name in candidates:
+            if (self.data_dir / name).exists():
+                return self.data_dir / name
+        raise FileNotFoundError(f"No history file for sensor '{sensor}' in {self.data_dir}")
+
+    # ---- optimizer ---- #
+
+    def plan(self, features) -> dict:
+        """Groups pending features into one scan per sensor and one groupby per window."""
+        plan = {}
+        for feature in features:
+            if feature in self._aggregates:
+                continue
+            windows = plan.setdefault(feature.sensor, {})
+            windows.setdefault((feature.start, feature.end), []).append(feature.stat)
+        return plan
+
+    def explain(self, query: Query) -> str:
+        lines = []
+        cached = [f.name for f in query.features if f in self._aggregates]
+        for sensor, windows in self.plan(query.features).items():
+            hours = frozenset().union(*(window_hours(*w) for w in windows))
+            scanned = self._scans.get(sensor)
+            reuse = ""
+            if scanned and hours <= scanned[0]:
+                reuse = " (cached)"
+            elif scanned:
+                hours |= scanned[0]
+            lines.append(f"Scan {self.sensor_file(sensor).name} hours={sorted(hours)}{reuse}")
+            for (start, end), stats in windows.items():
+                lines.append(f"  Aggregate {start:02d}→{end:02d}: {', '.join(stats)}")
+        if cached:
+            lines.append(f"Reuse cached: {', '.join(cached)}")
+        if query.oura is not None:
+            name = query.oura if not isinstance(query.oura, pd.DataFrame) else "<DataFrame>"
+            lines.append(f"Join {name} on date")
+        return "\n".join(lines)
+
+    # ---- execution ---- #
+
+    def _scan(self, sensor: str, hours: frozenset) -> pd.DataFrame:
+        cached = self._scans.get(sensor)
+        if cached and hours <= cached[0]:
+            return cached[1]
+        if cached:
+            hours |= cached[0]   # widen the scan so earlier windows stay served from the cache
+
+        path = self.sensor_file(sensor)
+        df = pd.read_csv(path, usecols=['state', 'last_changed'])
+        df['last_changed'] = pd.to_datetime(df['last_changed'], utc=True, errors='coerce', format='ISO8601')
+        df['state'] = pd.to_numeric(df['state'], errors='coerce')
+        df = df.dropna(subset=['last_changed', 'state'])
+
+        local_ts = df['last_changed'].dt.tz_convert(TIMEZONE)
+        hour = local_ts.dt.hour
+        keep = hour.isin(hours).to_numpy()   # pushed-down hour filter
+        df = pd.DataFrame({
+            'hour': hour.to_numpy()[keep],
+            'night_date': (local_ts[keep] - pd.Timedelta(hours=NIGHT_SHIFT_HOURS)).dt.date.to_numpy(),
+            'state': df['state'].to_numpy()[keep],
+        })
+
+        if self.drift_correct and sensor == 'co2':
+            baseline = build_baseline(self.data_dir / RAW_CO2_FILENAME, self.data_dir / BASELINE_FILENAME)
+            df = apply_drift_correction(df, baseline)
+        if self.exclude_flagged:
+            df = exclude_flagged_nights(df, self.data_dir / QA_FILENAME, sensor, date_col='night_date')
+
+        self._scans[sensor] = (hours, df)
+        return df
+
+    def execute(self, features) -> pd.DataFrame:
+        for sensor, windows in self.plan(features).items():
+            hours = frozenset().union(*(window_hours(*w) for w in windows))
+            readings = self._scan(sensor, hours)
+            for (start, end), stats in windows.items():
+                subset = readings[readings['hour'].isin(window_hours(start, end))]
+                agg = subset.groupby('night_date')['state'].agg(stats)
+                for stat in stats:
+                    self._aggregates[Feature(sensor, start, end, stat)] = agg[stat]
+
+        if not features:
+            return pd.DataFrame(columns=['date'])
+        nightly = pd.concat({f.name: self._aggregates[f] for f in features}, axis=1)
+        nightly.index.name = 'date'
+        return nightly.reset_index()
+
+    def oura(self, source) -> pd.DataFrame:
+        if isinstance(source, pd.DataFrame):
+            return source
+        path = Path(source)
+        if not path.is_absolute():
+            path = self.data_dir / path
+        if path not in self._oura:
+            df = pd.read_csv(path)
+            df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.date
+            self._oura[path] = df.dropna(subset=['date'])
+        return self._oura[path]
+
+
+if __name__ == "__main__":
+    ds = NightlyDataset()
+    query = (ds.sensor("co2").stat("mean", "max")
+               .window(23, 3).stat("mean")
+               .window(3, 7).stat("mean")
+               .join(OURA_FILENAME))
+    print("🧭 Plan:")
+    print(query.explain())
+    print("\n📊 Correlation Summary (top 15):")
+    print(query.correlate().head(15).to_string(index=False))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+shard_analyze.py
+
+Sharded map-reduce correlation analysis for many households / bedrooms.
+
+Each subfolder of the households directory is one shard laid out like `data/`
+(`*_history_cleaned.csv` sensor files + `oura_trends.csv`). A worker process
+per shard computes nightly sensor features and emits mergeable sufficient
+statistics (n, Σx, Σy, Σx², Σy², Σxy) for every feature × Oura metric pair.
+The reducer sums them into per-household, pooled and within-household
+correlation tables.
+
+Shard results are cached next to the output together with the list of
+input files and their mtimes, so adding a household only costs that
+household's shard, and a shard is recomputed when any of its inputs is
+added, changed or removed.
+
+Author: Your Name
+"""
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import t
+
+from data_quality import exclude_flagged_nights, sensor_name_from_path, QA_FILENAME
+
+# --------------------- Configuration --------------------- #
+
+HOUSEHOLDS_DIR = Path(__file__).resolve().parent.parent / "households"
+SENSOR_PATTERN = "*_history_cleaned.csv"
+OURA_FILENAME = "oura_trends.csv"
+SHARD_DIRNAME = "shards"
+TIMEZONE = "Europe/Helsinki"
+SLEEP_START_HOUR = 23
+SLEEP_END_HOUR = 7
+NIGHT_SHIFT_HOURS = 7
+MIN_NIGHTS = 10
+
+MOMENT_COLUMNS = ['n', 'sx', 'sy', 'sxx', 'syy', 'sxy']
+
+# --------------------- Map --------------------- #
+
+def nightly_features(path: Path) -> pd.DataFrame:
+    sensor = sensor_name_from_path(path)
+    df = pd.read_csv(path, usecols=['state', 'last_changed'])
+    df['last_changed'] = pd.to_datetime(df['last_changed'], utc=True, errors='coerce', format='ISO8601')
+    df['state'] = pd.to_numeric(df['state'], errors='coerce')
+    df = df.dropna(subset=['last_changed', 'state'])
+
+    df['local_ts'] = df['last_changed'].dt.tz_convert(TIMEZONE)
+    df['hour'] = df['local_ts'].dt.hour
+    df = df[(df['hour'] >= SLEEP_START_HOUR) | (df['hour'] < SLEEP_END_HOUR)].copy()
+    df['date'] = (df['local_ts'] - pd.Timedelta(hours=NIGHT_SHIFT_HOURS)).dt.date
+
+    nightly = df.groupby('date')['state'].agg(['mean', 'max']).reset_index()
+    nightly.columns = ['date', f'{sensor}_mean', f'{sensor}_max']
+    return exclude_flagged_nights(nightly, path.parent / QA_FILENAME, sensor)
+
+def load_oura(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.date
+    return df.dropna(subset=['date'])
+
+def pair_moments(features: pd.DataFrame, oura: pd.DataFrame) -> pd.DataFrame:
+    """Sufficient statistics for every feature × metric pair over the shared nights."""
+    feature_cols = [c for c in features.columns if c != 'date']
+    metric_cols = oura.select_dtypes(include='number').columns.tolist()
+    merged = pd.merge(features, oura[['date'] + metric_cols], on='date')
+
+    X = merged[feature_cols].to_numpy(dtype=float)
+    Y = merged[metric_cols].to_numpy(dtype=float)
+    # Pairwise-complete observations, computed with matrix products
+    mx, my = ~np.isnan(X), ~np.isnan(Y)
+    X0, Y0 = np.nan_to_num(X), np.nan_to_num(Y)
+    mxf, myf = mx.astype(float), my.astype(float)
+
+    stats = {
+        'n': mxf.T @ myf,
+        'sx': X0.T @ myf,
+        'sy': mxf.T @ Y0,
+        'sxx': (X0 ** 2).T @ myf,
+        'syy': mxf.T @ (Y0 ** 2),
+        'sxy': X0.T @ Y0,
+    }
+    index = pd.MultiIndex.from_product([feature_cols, metric_cols], names=['feature', 'metric'])
+    return pd.DataFrame({k: v.ravel() for k, v in stats.items()}, index=index).reset_index()
+
+def map_household(household_dir: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    sensor_paths = sorted(household_dir.glob(SENSOR_PATTERN))
+    features = None
+    for path in sensor_paths:
+        nightly = nightly_features(path)
+        features = nightly if features is None else pd.merge(features, nightly, on='date', how='outer')
+
+    moments = pair_moments(features, load_oura(household_dir / OURA_FILENAME))
+    moments.insert(0, 'household', household_dir.name)
+    features.insert(0, 'household', household_dir.name)
+    return moments, features
+
+def shard_inputs(household_dir: Path) -> pd.DataFrame:
+    """The files a shard is computed from, with their modification times."""
+    inputs = sorted(household_dir.glob(SENSOR_PATTERN)) + [household_dir / OURA_FILENAME, household_dir / QA_FILENAME]
+    return pd.DataFrame(
+        [(p.name, p.stat().st_mtime_ns) for p in inputs if p.exists()],
+        columns=['file', 'mtime_ns'],
+    )
+
+def shard_is_fresh(household_dir: Path, shard_path: Path, inputs_path: Path) -> bool:
+    """Fresh only when the recorded inputs match the current files exactly (added, removed or changed)."""
+    if not shard_path.exists() or not inputs_path.exists():
+        return False
+    recorded = pd.read_csv(inputs_path)
+    return recorded.equals(shard_inputs(household_dir))
+
+def run_shard(household_dir: Path, shard_dir: Path) -> Path:
+    """Worker entry point: writes the shard's moments, nightly features and input list."""
+    inputs = shard_inputs(household_dir)   # taken first, so edits during the run count as stale
+    moments, features = map_household(household_dir)
+    features.to_csv(shard_dir / f"{household_dir.name}.nights.csv", index=False)
+    shard_path = shard_dir / f"{household_dir.name}.moments.csv"
+    moments.to_csv(shard_path, index=False)
+    inputs.to_csv(shard_dir / f"{household_dir.name}.inputs.csv", index=False)
+    return shard_path
+
+# --------------------- Reduce --------------------- #
+
+def correlation_table(moments: pd.DataFrame) -> pd.DataFrame:
+    n = moments['n']
+    cov = moments['sxy'] - moments['sx'] * moments['sy'] / n
+    var_x = moments['sxx'] - moments['sx'] ** 2 / n
+    var_y = moments['syy'] - moments['sy'] ** 2 / n
+    r = (cov / np.sqrt(var_x * var_y)).clip(-1, 1)
+    return finish_table(moments, n, r, slope=cov / var_x)
+
+def finish_table(moments: pd.DataFrame, n: pd.Series, r: pd.Series, slope: pd.Series, dof_loss: int = 2) -> pd.DataFrame:
+    dof = n - dof_loss
+    t_stat = r * np.sqrt(dof / (1 - r ** 2))
+    p = 2 * t.sf(np.abs(t_stat), dof)
+    keys = [c for c in ['household', 'feature', 'metric'] if c in moments.columns]
+    table = moments[keys].assign(**{
+        'N': n.astype(int),
+        'Pearson r': r.round(3),
+        'p-value': np.round(p, 4),
+        'Slope': slope.round(3),
+    })
+    return table[(table['N'] >= MIN_NIGHTS) & table['Pearson r'].notna()]
+
+def reduce_pooled(moments: pd.DataFrame) -> pd.DataFrame:
+    pooled = moments.groupby(['feature', 'metric'])[MOMENT_COLUMNS].sum().reset_index()
+    return correlation_table(pooled)
+
+def reduce_within(moments: pd.DataFrame) -> pd.DataFrame:
+    """Pooled correlation of household-centered values (removes between-household offsets)."""
+    m = moments[moments['n'] > 0]
+    centered = pd.DataFrame({
+        'feature': m['feature'],
+        'metric': m['metric'],
+        'n': m['n'],
+        'cxy': m['sxy'] - m['sx'] * m['sy'] / m['n'],
+        'cxx': m['sxx'] - m['sx'] ** 2 / m['n'],
+        'cyy': m['syy'] - m['sy'] ** 2 / m['n'],
+        'households': 1,
+    }).groupby(['feature', 'metric']).sum().reset_index()
+    r = (centered['cxy'] / np.sqrt(centered['cxx'] * centered['cyy'])).clip(-1, 1)
+    slope = centered['cxy'] / centered['cxx']
+    # One mean per household is estimated, so those degrees of freedom are lost
+    return finish_table(centered, centered['n'], r, slope, dof_loss=centered['households'] + 1)
+
+# --------------------- Main --------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded CO₂/sensor vs Oura analysis over many households")
+    parser.add_argument("--households-dir", help="Folder with one data folder per household")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every shard")
+    args = parser.parse_args()
+
+    root = Path(args.households_dir).expanduser().resolve() if args.households_dir else HOUSEHOLDS_DIR
+    if not root.exists():
+        sys.exit(f"❌ Households directory not found: {root}")
+    households = sorted(p for p in root.iterdir()
+                        if p.is_dir() and (p / OURA_FILENAME).exists() and any(p.glob(SENSOR_PATTERN)))
+    if not households:
+        sys.exit(f"❌ No household folders with {OURA_FILENAME} and {SENSOR_PATTERN} in: {root}")
+
+    shard_dir = root / SHARD_DIRNAME
+    shard_dir.mkdir(exist_ok=True)
+    stale = [h for h in households
+             if args.rebuild or not shard_is_fresh(h, shard_dir / f"{h.name}.moments.csv",
+                                                    shard_dir / f"{h.name}.inputs.csv")]
+
+    print(f"📂 Households: {len(households)} ({len(stale)} shard(s) to compute)")
+    if stale:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for path in pool.map(run_shard, stale, [shard_dir] * len(stale)):
+                print(f" - ✅ {path.name}")
+
+    moments = pd.concat([pd.read_csv(shard_dir / f"{h.name}.moments.csv") for h in households],
+                        ignore_index=True)
+
+    per_household = correlation_table(moments)
+    pooled = reduce_pooled(moments)
+    within = reduce_within(moments)
+
+    per_household.to_csv(root / "correlations_per_household.csv", index=False)
+    pooled.to_csv(root / "correlations_pooled.csv", index=False)
+    within.to_csv(root / "correlations_within.csv", index=False)
+
+    by_abs_r = dict(by='Pearson r', key=lambda x: x.abs(), ascending=False)
+    print("\n📊 Pooled Correlation Summary (top 15):")
+    print(pooled.sort_values(**by_abs_r).head(15).to_string(index=False))
+    print("\n📊 Within-Household Correlation Summary (top 15):")
+    print(within.sort_values(**by_abs_r).head(15).to_string(index=False))
+    print(f"\n✅ Tables saved to: {root}")
+
+
+if __name__ == "__main__":
+    main()
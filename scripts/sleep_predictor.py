@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+sleep_predictor.py
+
+Morning sleep-metric prediction from overnight CO₂, before the Oura sync.
+
+One recursive least squares (RLS) model per Oura metric, on the same nightly
+features as `auto_analyze_co2_sleep.py` (avg_co2, max_co2). RLS updates one
+night at a time, so the model never refits on the full history, and its
+state (coefficients + inverse covariance + the nights already learned) is
+persisted as JSON. Each night is learned at most once, whether it arrives
+through `update` or `POST /observe`.
+
+Subcommands:
+- update: feed every night not learned yet into the models
+- serve:  local HTTP endpoint
+    POST /predict  {"readings": [ppm, ...]}  or  {"avg_co2": ..., "max_co2": ...}
+    POST /observe  {"date": "YYYY-MM-DD", "readings" | features..., "metrics": {...}}
+    GET  /health
+
+Author: Your Name
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from auto_analyze_co2_sleep import load_and_prepare_co2, load_and_prepare_oura, CO2_FILENAME, OURA_FILENAME
+from data_quality import exclude_flagged_nights, QA_FILENAME
+
+# --------------------- Configuration --------------------- #
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+STATE_FILENAME = "predictor_state.json"
+HOST = "127.0.0.1"
+PORT = 8765
+
+TARGET_METRICS = [
+    "Sleep Score",
+    "Total Sleep Score",
+    "REM Sleep Duration",
+    "Deep Sleep Duration",
+    "Lowest Resting Heart Rate",
+    "Respiratory Rate",
+]
+FEATURES = ['avg_co2', 'max_co2']
+CO2_CENTER = 700.0     # fixed scaling keeps the RLS problem well conditioned
+CO2_SCALE = 100.0
+FORGETTING_FACTOR = 0.995
+INITIAL_COVARIANCE = 1000.0
+
+# --------------------- Model --------------------- #
+
+class RLSModel:
+    """Recursive least squares with exponential forgetting."""
+
+    def __init__(self, n_features: int, lam: float = FORGETTING_FACTOR, delta: float = INITIAL_COVARIANCE):
+        self.lam = lam
+        self.theta = np.zeros(n_features)
+        self.P = np.eye(n_features) * delta
+        self.n = 0
+
+    def predict(self, x: np.ndarray) -> float:
+        return float(self.theta @ x)
+
+    def update(self, x: np.ndarray, y: float):
+        Px = self.P @ x
+        gain = Px / (self.lam + x @ Px)
+        self.theta = self.theta + gain * (y - self.theta @ x)
+        self.P = (self.P - np.outer(gain, Px)) / self.lam
+        self.n += 1
+
+    def to_dict(self) -> dict:
+        return {'lam': self.lam, 'theta': self.theta.tolist(), 'P': self.P.tolist(), 'n': self.n}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'RLSModel':
+        model = cls(len(d['theta']), d['lam'])
+        model.theta = np.array(d['theta'])
+        model.P = np.array(d['P'])
+        model.n = d['n']
+        return model
+
+class SleepPredictor:
+    """One RLS model per target metric, plus the last night that was learned."""
+
+    def __init__(self, targets=TARGET_METRICS):
+        self.models = {t: RLSModel(len(FEATURES) + 1) for t in targets}
+        self.learned = set()
+        self.learned_through = None     # states saved before `learned` was tracked
+        self.last_date = None
+
+    def is_learned(self, date) -> bool:
+        return date in self.learned or (self.learned_through is not None and date <= self.learned_through)
+
+    @staticmethod
+    def features_from_readings(readings) -> dict:
+        values = np.asarray(readings, dtype=float)
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            raise ValueError("No numeric readings")
+        return {'avg_co2': float(values.mean()), 'max_co2': float(values.max())}
+
+    @staticmethod
+    def vector(features: dict) -> np.ndarray:
+        values = np.array([float(features[f]) for f in FEATURES])
+        if not np.isfinite(values).all():
+            bad = [f for f, v in zip(FEATURES, values) if not np.isfinite(v)]
+            raise ValueError(f"Feature(s) not finite: {', '.join(bad)}")
+        return np.concatenate([[1.0], (values - CO2_CENTER) / CO2_SCALE])
+
+    def predict(self, features: dict) -> dict:
+        x = self.vector(features)
+        return {t: round(m.predict(x), 2) for t, m in self.models.items() if m.n > 0}
+
+    def observe(self, date, features: dict, metrics: dict):
+        if self.is_learned(date):
+            raise ValueError(f"Night {date} was already learned")
+        x = self.vector(features)
+        # Validate every metric first so a bad value can't leave the models half-updated
+        targets = {}
+        for target in self.models:
+            y = metrics.get(target)
+            if y is None:
+                continue
+            try:
+                y = float(y)
+            except (TypeError, ValueError):
+                raise ValueError(f"Metric '{target}' is not numeric: {y!r}") from None
+            if np.isnan(y):
+                continue                # missing metric
+            if not np.isfinite(y):
+                raise ValueError(f"Metric '{target}' is not finite: {y!r}")
+            targets[target] = y
+        for target, y in targets.items():
+            self.models[target].update(x, y)
+        self.learned.add(date)
+        self.last_date = max(self.last_date, date) if self.last_date else date
+
+    def save(self, path: Path):
+        state = {
+            'last_date': str(self.last_date) if self.last_date else None,
+            'learned': sorted(str(d) for d in self.learned),
+            'learned_through': str(self.learned_through) if self.learned_through else None,
+            'features': FEATURES,
+            'models': {t: m.to_dict() for t, m in self.models.items()},
+        }
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(state))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'SleepPredictor':
+        predictor = cls()
+        if not path.exists():
+            return predictor
+        state = json.loads(path.read_text())
+        if state.get('features') != FEATURES:
+            sys.exit(f"❌ {path.name} was built with features {state.get('features')}; delete it to start over.")
+        predictor.models.update({t: RLSModel.from_dict(d) for t, d in state['models'].items()})
+        if state['last_date']:
+            predictor.last_date = pd.to_datetime(state['last_date']).date()
+        predictor.learned = {pd.to_datetime(d).date() for d in state.get('learned', [])}
+        if 'learned' not in state:
+            # Older states only kept the newest night; treat everything up to it as learned
+            predictor.learned_through = predictor.last_date
+        elif state.get('learned_through'):
+            predictor.learned_through = pd.to_datetime(state['learned_through']).date()
+        return predictor
+
+# --------------------- Update --------------------- #
+
+def update_from_history(predictor: SleepPredictor, data_dir: Path) -> int:
+    """Feeds every night not learned yet, oldest first (including gaps left by /observe)."""
+    nightly = load_and_prepare_co2(data_dir / CO2_FILENAME)
+    nightly = exclude_flagged_nights(nightly, data_dir / QA_FILENAME, "co2")
+    oura = load_and_prepare_oura(data_dir / OURA_FILENAME)
+    merged = pd.merge(nightly, oura, on='date').sort_values('date')
+    merged = merged[~merged['date'].map(predictor.is_learned)]
+
+    for row in merged.to_dict('records'):
+        predictor.observe(row['date'], row, row)
+    return len(merged)
+
+# --------------------- Server --------------------- #
+
+def make_handler(predictor: SleepPredictor, state_path: Path):
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _features(self, payload: dict) -> dict:
+            if 'readings' in payload:
+                return predictor.features_from_readings(payload['readings'])
+            return {f: payload[f] for f in FEATURES}
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self._send(404, {'error': 'not found'})
+            self._send(200, {
+                'last_date': str(predictor.last_date) if predictor.last_date else None,
+                'nights': {t: m.n for t, m in predictor.models.items()},
+            })
+
+        def do_POST(self):
+            start = time.perf_counter()
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("Request body must be a JSON object")
+                metrics = payload.get('metrics', {})
+                if not isinstance(metrics, dict):
+                    raise ValueError("'metrics' must be a JSON object")
+                features = self._features(payload)
+                with lock:
+                    if self.path == "/predict":
+                        result = {'features': features, 'predictions': predictor.predict(features)}
+                    elif self.path == "/observe":
+                        date = pd.to_datetime(payload['date']).date()
+                        predictor.observe(date, features, metrics)
+                        predictor.save(state_path)
+                        result = {'last_date': str(predictor.last_date)}
+                    else:
+                        return self._send(404, {'error': 'not found'})
+            except KeyError as e:
+                return self._send(400, {'error': f"missing field {e}"})
+            except (ValueError, TypeError) as e:
+                return self._send(400, {'error': str(e)})
+            result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self._send(200, result)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+# --------------------- Main --------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict Oura sleep metrics from overnight CO₂")
+    parser.add_argument("--data-dir", help="Path to your data folder")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("update", help="Learn from every night not learned yet")
+    serve = sub.add_parser("serve", help="Run the local prediction endpoint")
+    serve.add_argument("--host", default=HOST)
+    serve.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).expanduser().resolve() if args.data_dir else DATA_DIR
+    state_path = data_dir / STATE_FILENAME
+    predictor = SleepPredictor.load(state_path)
+
+    if args.command == "update":
+        for name in (CO2_FILENAME, OURA_FILENAME):
+            if not (data_dir / name).exists():
+                sys.exit(f"❌ Missing file: {data_dir / name}")
+        added = update_from_history(predictor, data_dir)
+        predictor.save(state_path)
+        print(f"✅ Learned {added} new night(s); last night: {predictor.last_date}")
+        print(f"💾 State saved to: {state_path}")
+        return
+
+    if predictor.last_date is None:
+        print("⚠️  No saved model state yet, run `update` first (or POST /observe).")
+    print(f"🌙 Serving predictions on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    server = HTTPServer((args.host, args.port), make_handler(predictor, state_path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
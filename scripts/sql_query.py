@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+sql_query.py
+
+Embedded SQL layer (SQLite, no extra dependencies) over the sensor and Oura data.
+
+Subcommands:
+- build: ingest raw `*_history.csv` sensor exports and the Oura file into
+  `data/sleep.sqlite` (only files changed since the last build are reloaded)
+- query: run SQL against the database, refreshing it first if needed
+
+Tables and views:
+- readings(sensor, entity_id, ts_utc, local_ts, local_hour, night_id, value)
+- oura (all Oura columns, plus night_id)
+- qa_nights (when data_quality.py has written qa_nights.csv)
+- ventilation_nightly (when ventilation_events.py has written ventilation_nightly.csv)
+- nightly_features: per sensor and night over the sleep window (mean/max/min/readings)
+- nightly_merged: Oura metrics with every sensor's nightly mean/max as columns
+
+Example:
+    python scripts/sql_query.py query "
+        SELECT AVG(r.value) FROM readings r JOIN oura o USING (night_id)
+        WHERE r.sensor = 'co2' AND r.local_hour BETWEEN 2 AND 3 AND o.\"Sleep Score\" < 70"
+
+Author: Your Name
+"""
+
+import sys
+import sqlite3
+import argparse
+import pandas as pd
+from pathlib import Path
+
+from data_quality import sensor_name_from_path, HISTORY_PATTERN, QA_FILENAME
+from ventilation_events import NIGHTLY_FILENAME as VENTILATION_FILENAME
+
+# --------------------- Configuration --------------------- #
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DB_FILENAME = "sleep.sqlite"
+OURA_FILENAME = "oura_trends.csv"
+TIMEZONE = "Europe/Helsinki"
+SLEEP_START_HOUR = 23
+SLEEP_END_HOUR = 7
+NIGHT_SHIFT_HOURS = 7
+CHUNK_SIZE = 100_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (target TEXT PRIMARY KEY, file TEXT, mtime REAL);
+CREATE TABLE IF NOT EXISTS readings (
+    sensor TEXT, entity_id TEXT, ts_utc TEXT, local_ts TEXT,
+    local_hour INTEGER, night_id TEXT, value REAL
+);
+CREATE INDEX IF NOT EXISTS idx_readings_night ON readings (sensor, night_id, local_hour, value);
+CREATE INDEX IF NOT EXISTS idx_readings_entity ON readings (entity_id, ts_utc);
+"""
+
+# --------------------- Ingest --------------------- #
+
+# Each load target ('oura', 'readings:co2', ...) remembers the file it was loaded from
+
+def is_stale(conn: sqlite3.Connection, target: str, path: Path) -> bool:
+    row = conn.execute("SELECT file, mtime FROM sources WHERE target = ?", (target,)).fetchone()
+    return row is None or row[0] != path.name or row[1] < path.stat().st_mtime
+
+def mark_loaded(conn: sqlite3.Connection, target: str, path: Path):
+    conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (target, path.name, path.stat().st_mtime))
+
+def drop_target(conn: sqlite3.Connection, target: str):
+    """Removes what a target loaded once its source file is gone."""
+    if target.startswith("readings:"):
+        conn.execute("DELETE FROM readings WHERE sensor = ?", (target.split(":", 1)[1],))
+    else:
+        conn.execute(f"DROP TABLE IF EXISTS {target}")
+    conn.execute("DELETE FROM sources WHERE target = ?", (target,))
+
+def upgrade_sources(conn: sqlite3.Connection):
+    """Databases built before targets were tracked are reloaded from scratch."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sources)")]
+    if columns and 'target' not in columns:
+        conn.execute("DROP TABLE sources")
+
+def ingest_sensor(conn: sqlite3.Connection, path: Path) -> int:
+    """Streams a raw history export into `readings`, chunk by chunk."""
+    sensor = sensor_name_from_path(path)
+    conn.execute("DELETE FROM readings WHERE sensor = ?", (sensor,))
+    total = 0
+    for chunk in pd.read_csv(path, usecols=['entity_id', 'state', 'last_changed'], chunksize=CHUNK_SIZE):
+        chunk['value'] = pd.to_numeric(chunk['state'], errors='coerce')
+        chunk['ts'] = pd.to_datetime(chunk['last_changed'], utc=True, errors='coerce', format='ISO8601')
+        chunk = chunk.dropna(subset=['ts', 'value'])
+        local_ts = chunk['ts'].dt.tz_convert(TIMEZONE)
+        rows = pd.DataFrame({
+            'sensor': sensor,
+            'entity_id': chunk['entity_id'],
+            'ts_utc': chunk['ts'].dt.strftime('%Y-%m-%dT%H:%M:%S'),
+            'local_ts': local_ts.dt.strftime('%Y-%m-%dT%H:%M:%S'),
+            'local_hour': local_ts.dt.hour,
+            'night_id': (local_ts - pd.Timedelta(hours=NIGHT_SHIFT_HOURS)).dt.strftime('%Y-%m-%d'),
+            'value': chunk['value'],
+        })
+        conn.executemany("INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         rows.itertuples(index=False, name=None))
+        total += len(rows)
+    return total
+
+def ingest_table(conn: sqlite3.Connection, path: Path, table: str, date_col: str) -> int:
+    df = pd.read_csv(path)
+    df['night_id'] = pd.to_datetime(df[date_col], errors='coerce').dt.strftime('%Y-%m-%d')
+    df = df.dropna(subset=['night_id'])
+    df.to_sql(table, conn, if_exists='replace', index=False)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_night ON {table} (night_id)")
+    return len(df)
+
+def create_views(conn: sqlite3.Connection):
+    conn.executescript(f"""
+        DROP VIEW IF EXISTS nightly_merged;
+        DROP VIEW IF EXISTS nightly_features;
+        CREATE VIEW nightly_features AS
+            SELECT sensor, night_id,
+                   AVG(value) AS mean, MAX(value) AS max, MIN(value) AS min, COUNT(*) AS readings
+            FROM readings
+            WHERE local_hour >= {SLEEP_START_HOUR} OR local_hour < {SLEEP_END_HOUR}
+            GROUP BY sensor, night_id;
+    """)
+    has_oura = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'oura'").fetchone()
+    if not has_oura:
+        return
+
+    sensors = [row[0] for row in conn.execute("SELECT DISTINCT sensor FROM readings ORDER BY sensor")]
+    columns = ", ".join(f"{s}.mean AS {s}_mean, {s}.max AS {s}_max" for s in sensors)
+    joins = " ".join(
+        f"LEFT JOIN nightly_features {s} ON {s}.sensor = '{s}' AND {s}.night_id = o.night_id"
+        for s in sensors
+    )
+    conn.execute(f"CREATE VIEW nightly_merged AS SELECT o.*{', ' + columns if columns else ''} FROM oura o {joins}")
+
+def build_database(data_dir: Path, oura_filename: str = OURA_FILENAME, verbose: bool = True) -> Path:
+    db_path = data_dir / DB_FILENAME
+    conn = sqlite3.connect(db_path)
+    try:
+        upgrade_sources(conn)
+        conn.executescript(SCHEMA)
+        sources = {f"readings:{sensor_name_from_path(p)}": (p, None) for p in sorted(data_dir.glob(HISTORY_PATTERN))}
+        sources.update({
+            'oura': (data_dir / oura_filename, 'date'),
+            'qa_nights': (data_dir / QA_FILENAME, 'night_date'),
+            'ventilation_nightly': (data_dir / VENTILATION_FILENAME, 'night_date'),
+        })
+        sources = {target: source for target, source in sources.items() if source[0].exists()}
+
+        changed = False
+        for (target,) in conn.execute("SELECT target FROM sources").fetchall():
+            if target not in sources:
+                drop_target(conn, target)
+                changed = True
+                if verbose:
+                    print(f" - 🗑️  {target}: source file removed")
+
+        for target, (path, date_col) in sources.items():
+            if not is_stale(conn, target, path):
+                continue
+            rows = ingest_sensor(conn, path) if date_col is None else ingest_table(conn, path, target, date_col)
+            mark_loaded(conn, target, path)
+            changed = True
+            if verbose:
+                print(f" - 📥 {path.name} → {target}: {rows} rows")
+
+        if changed:
+            create_views(conn)
+            conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return db_path
+
+# --------------------- Query --------------------- #
+
+def run_query(db_path: Path, sql: str) -> pd.DataFrame:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(sql, conn)
+    finally:
+        conn.close()
+
+def describe_database(db_path: Path) -> str:
+    objects = run_query(db_path, "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'view') ORDER BY type, name")
+    return objects.to_string(index=False)
+
+# --------------------- Main --------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL over cleaned sensor and Oura data")
+    parser.add_argument("--data-dir", help="Path to your data folder")
+    parser.add_argument("--oura", default=OURA_FILENAME, help="Oura file to load as the `oura` table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Create or refresh the SQLite database")
+    query = sub.add_parser("query", help="Run a SQL query (lists tables/views without one)")
+    query.add_argument("sql", nargs="?", help="SQL statement")
+    query.add_argument("--csv", help="Write the result to this CSV file instead of printing it")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).expanduser().resolve() if args.data_dir else DATA_DIR
+    if not data_dir.exists():
+        sys.exit(f"❌ Data directory not found: {data_dir}")
+
+    db_path = build_database(data_dir, args.oura, verbose=args.command == "build")
+    if args.command == "build":
+        print(f"✅ Database ready: {db_path}")
+        return
+
+    if not args.sql:
+        print(describe_database(db_path))
+        return
+    try:
+        result = run_query(db_path, args.sql)
+    except Exception as e:
+        sys.exit(f"❌ Query failed: {e}")
+
+    if args.csv:
+        result.to_csv(args.csv, index=False)
+        print(f"✅ {len(result)} rows saved to: {args.csv}")
+    else:
+        print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,10 @@ from statsmodels.nonparametric.smoothers_lowess import lowess
 from scipy.stats import pearsonr
 from pathlib import Path
 
+from nightly_dataset import NightlyDataset, Feature
+
 # --- Configuration ---
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-CO2_FILE = DATA_DIR / "co2_history.csv"
 OURA_FILE = DATA_DIR / "oura_trends.csv"
 TARGET_COLUMN = "Restfulness Score"  # ← Change this to "REM Sleep Duration", "Respiratory Rate", etc.
 
@@ -21,28 +22,14 @@ TIME_WINDOWS = {
     "mid_night": (1, 5),
 }
 
-def load_and_merge(start_h, end_h):
-    co2 = pd.read_csv(CO2_FILE)
-    co2['last_changed'] = pd.to_datetime(co2['last_changed'], utc=True)
-    co2['state'] = pd.to_numeric(co2['state'], errors='coerce')
-    co2 = co2.dropna(subset=['state'])
-    co2['local_time'] = co2['last_changed'].dt.tz_convert("Europe/Helsinki")
-    co2['hour'] = co2['local_time'].dt.hour
-    co2['night'] = (co2['local_time'] - pd.Timedelta(hours=7)).dt.date
-
-    if start_h < end_h:
-        co2 = co2[(co2['hour'] >= start_h) & (co2['hour'] < end_h)]
-    else:
-        co2 = co2[(co2['hour'] >= start_h) | (co2['hour'] < end_h)]
-
-    summary = co2.groupby('night')['state'].mean().reset_index()
-    summary.columns = ['date', 'mean_co2']
+# One shared scan of the raw CO₂ history serves every window
+DATASET = NightlyDataset(DATA_DIR, prefer_cleaned=False, exclude_flagged=False)
 
-    oura = pd.read_csv(OURA_FILE)
-    oura['date'] = pd.to_datetime(oura['date']).dt.date
-
-    df = pd.merge(summary, oura, on='date')
-    return df.dropna(subset=[TARGET_COLUMN])
+def load_and_merge(start_h, end_h):
+    feature = Feature("co2", start_h, end_h, "mean").name
+    df = DATASET.sensor("co2").window(start_h, end_h).stat("mean").join(OURA_FILE).collect()
+    df = df.rename(columns={feature: 'mean_co2'})
+    return df.dropna(subset=['mean_co2', TARGET_COLUMN])
 
 def plot_loess(df, label):
     x = df['mean_co2'].values
@@ -61,6 +48,12 @@ def plot_loess(df, label):
     plt.show()
 
 def compare_windows():
+    # Plan all windows together so the CO₂ history is scanned once
+    query = DATASET.sensor("co2")
+    for start, end in TIME_WINDOWS.values():
+        query = query.window(start, end).stat("mean")
+    query.collect()
+
     results = []
     for label, (start, end) in TIME_WINDOWS.items():
         df = load_and_merge(start, end)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+ventilation_events.py
+
+Detects ventilation events (window opened, ventilation on) in the raw CO₂
+history and tags each night with them as new nightly features.
+
+Two detectors:
+- Slope events: runs of falling CO₂ found with vectorized diffs; a run counts
+  as an event when it drops at least MIN_DROP_PPM at MIN_RATE_PPM_PER_MIN or faster
+- Change points: binary segmentation of each night's sleep-window readings
+  with a Gaussian mean-shift cost evaluated from cumulative sums, so every
+  split search is a single O(n) NumPy pass
+
+Outputs `ventilation_events.csv` (one row per event) and
+`ventilation_nightly.csv` (one row per night) and compares Oura metrics
+between ventilated and sealed nights.
+
+Author: Your Name
+"""
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# --------------------- Configuration --------------------- #
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CO2_FILENAME = "co2_history.csv"
+OURA_FILENAME = "oura_trends.csv"
+EVENTS_FILENAME = "ventilation_events.csv"
+NIGHTLY_FILENAME = "ventilation_nightly.csv"
+TIMEZONE = "Europe/Helsinki"
+SLEEP_START_HOUR = 23
+SLEEP_END_HOUR = 7
+NIGHT_SHIFT_HOURS = 7
+
+MIN_DROP_PPM = 100
+MIN_RATE_PPM_PER_MIN = 1.0
+MAX_STEP_MINUTES = 90          # don't bridge gaps in the data
+CP_PENALTY = 3.0               # multiplied by σ² · log(n)
+CP_MIN_SEGMENT = 3             # readings per segment
+CP_MAX_CHANGES = 6             # per night
+
+# --------------------- Loading --------------------- #
+
+def load_co2(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, usecols=['entity_id', 'state', 'last_changed'])
+    df['last_changed'] = pd.to_datetime(df['last_changed'], utc=True, errors='coerce', format='ISO8601')
+    df['state'] = pd.to_numeric(df['state'], errors='coerce')
+    df = df.dropna(subset=['last_changed', 'state'])
+    # One contiguous, time-ordered series per entity (an export may hold several CO₂ sensors)
+    df = df.sort_values(['entity_id', 'last_changed'], kind='stable').reset_index(drop=True)
+
+    df['local_ts'] = df['last_changed'].dt.tz_convert(TIMEZONE)
+    df['hour'] = df['local_ts'].dt.hour
+    df['in_window'] = (df['hour'] >= SLEEP_START_HOUR) | (df['hour'] < SLEEP_END_HOUR)
+    df['night_date'] = (df['local_ts'] - pd.Timedelta(hours=NIGHT_SHIFT_HOURS)).dt.date
+    return df
+
+# --------------------- Slope Events --------------------- #
+
+def detect_slope_events(df: pd.DataFrame) -> pd.DataFrame:
+    """Falling runs of consecutive readings, filtered by total drop and rate."""
+    entity = df['entity_id']
+    new_entity = entity.ne(entity.shift()).to_numpy()
+    dt_min = df['last_changed'].diff().dt.total_seconds().to_numpy() / 60
+    falling = (np.diff(df['state'].to_numpy(), prepend=np.nan) < 0) & (dt_min <= MAX_STEP_MINUTES) & ~new_entity
+
+    # Step i (reading i-1 → i) belongs to a run; runs start where falling begins
+    run_id = np.cumsum(~falling)
+    steps = pd.DataFrame({'run': run_id[falling], 'end': np.flatnonzero(falling)})
+    if steps.empty:
+        # Typed like a real result so nightly_features can still use the .dt accessor
+        local = f"datetime64[ns, {TIMEZONE}]"
+        return pd.DataFrame({
+            'night_date': pd.Series(dtype=object),
+            'entity_id': pd.Series(dtype=object),
+            'start': pd.Series(dtype=local),
+            'end': pd.Series(dtype=local),
+            **{col: pd.Series(dtype=float) for col in ['pre_ppm', 'post_ppm', 'drop_ppm',
+                                                         'minutes', 'rate_ppm_per_min']},
+        })
+
+    runs = steps.groupby('run')['end'].agg(['min', 'max'])
+    start_idx = runs['min'].to_numpy() - 1
+    end_idx = runs['max'].to_numpy()
+
+    state = df['state'].to_numpy()
+    utc = df['last_changed'].dt.tz_convert(None).to_numpy()   # datetime64, avoids boxing Timestamps
+    events = pd.DataFrame({
+        'night_date': df['night_date'].to_numpy()[start_idx],
+        'entity_id': entity.to_numpy()[start_idx],
+        'in_window': df['in_window'].to_numpy()[start_idx],
+        'start': pd.to_datetime(utc[start_idx], utc=True).tz_convert(TIMEZONE),
+        'end': pd.to_datetime(utc[end_idx], utc=True).tz_convert(TIMEZONE),
+        'pre_ppm': state[start_idx].round(1),
+        'post_ppm': state[end_idx].round(1),
+    })
+    events['drop_ppm'] = (events['pre_ppm'] - events['post_ppm']).round(1)
+    events['minutes'] = (events['end'] - events['start']).dt.total_seconds() / 60
+    events['rate_ppm_per_min'] = (events['drop_ppm'] / events['minutes']).round(2)
+
+    keep = (events['drop_ppm'] >= MIN_DROP_PPM) & (events['rate_ppm_per_min'] >= MIN_RATE_PPM_PER_MIN)
+    return events[keep & events['in_window']].drop(columns='in_window').reset_index(drop=True)
+
+# --------------------- Change Points --------------------- #
+
+def best_split(cs: np.ndarray, cs2: np.ndarray, lo: int, hi: int) -> tuple[int, float]:
+    """Best single mean-shift split of x[lo:hi] and its cost reduction, from cumulative sums."""
+    k = np.arange(lo + CP_MIN_SEGMENT, hi - CP_MIN_SEGMENT + 1)
+    if len(k) == 0:
+        return -1, 0.0
+
+    def cost(a, b):
+        n = b - a
+        s = cs[b] - cs[a]
+        return (cs2[b] - cs2[a]) - s * s / n
+
+    gain = cost(lo, hi) - cost(lo, k) - cost(k, hi)
+    best = int(np.argmax(gain))
+    return int(k[best]), float(gain[best])
+
+def binary_segmentation(x: np.ndarray) -> list[int]:
+    """Change-point indices for a piecewise-constant mean, penalized by σ² log n."""
+    n = len(x)
+    if n < 2 * CP_MIN_SEGMENT:
+        return []
+    # Robust noise estimate from first differences (insensitive to the shifts themselves)
+    sigma = 1.4826 * np.median(np.abs(np.diff(x) - np.median(np.diff(x)))) / np.sqrt(2)
+    penalty = CP_PENALTY * max(sigma, 1.0) ** 2 * np.log(n)
+
+    cs = np.concatenate([[0.0], np.cumsum(x)])
+    cs2 = np.concatenate([[0.0], np.cumsum(x * x)])
+    # Best split per open segment; only the two halves of a new split are re-searched
+    candidates = {(0, n): best_split(cs, cs2, 0, n)}
+    changes = []
+    while candidates and len(changes) < CP_MAX_CHANGES:
+        (lo, hi), (split, gain) = max(candidates.items(), key=lambda c: c[1][1])
+        if split < 0 or gain <= penalty:
+            break
+        changes.append(split)
+        del candidates[(lo, hi)]
+        candidates[(lo, split)] = best_split(cs, cs2, lo, split)
+        candidates[(split, hi)] = best_split(cs, cs2, split, hi)
+    return sorted(changes)
+
+def detect_change_points(df: pd.DataFrame) -> pd.DataFrame:
+    window = df[df['in_window']]
+    state = window['state'].to_numpy()
+    utc = window['last_changed'].dt.tz_convert(None).to_numpy()
+    # Night (and entity) boundaries from the sorted columns, no per-row Python work
+    nights = window['night_date'].to_numpy()
+    entities = window['entity_id'].to_numpy()
+    boundary = (nights[1:] != nights[:-1]) | (entities[1:] != entities[:-1])
+    bounds = np.flatnonzero(np.r_[True, boundary, True])
+
+    rows = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        x = state[lo:hi]
+        for cp in binary_segmentation(x):
+            before, after = x[:cp], x[cp:]
+            rows.append({
+                'night_date': nights[lo],
+                'entity_id': entities[lo],
+                'time': utc[lo + cp],
+                'pre_ppm': round(float(before[-CP_MIN_SEGMENT:].mean()), 1),
+                'post_ppm': round(float(after[:CP_MIN_SEGMENT].mean()), 1),
+            })
+    changes = pd.DataFrame(rows, columns=['night_date', 'entity_id', 'time', 'pre_ppm', 'post_ppm'])
+    changes['time'] = pd.to_datetime(changes['time'], utc=True).dt.tz_convert(TIMEZONE)
+    return changes
+
+# --------------------- Nightly Features --------------------- #
+
+def nightly_features(df: pd.DataFrame, events: pd.DataFrame, changes: pd.DataFrame) -> pd.DataFrame:
+    nights = pd.DataFrame({'night_date': sorted(df.loc[df['in_window'], 'night_date'].unique())})
+
+    ev = events.sort_values('drop_ppm', ascending=False)
+    ev_agg = ev.groupby('night_date').agg(
+        vent_events=('drop_ppm', 'size'),
+        first_event=('start', 'min'),
+        max_drop_ppm=('drop_ppm', 'max'),
+        pre_ppm=('pre_ppm', 'first'),       # of the largest drop
+        post_ppm=('post_ppm', 'first'),
+    ).reset_index()
+    ev_agg['first_event'] = ev_agg['first_event'].dt.strftime('%H:%M')
+
+    drops = changes[changes['post_ppm'] < changes['pre_ppm']]
+    cp_agg = changes.groupby('night_date').agg(change_points=('time', 'size')).reset_index()
+    cp_agg = cp_agg.merge(
+        drops.groupby('night_date').agg(cp_drops=('time', 'size'),
+                                        first_cp_drop=('time', 'min')).reset_index(),
+        on='night_date', how='left'
+    )
+    cp_agg['first_cp_drop'] = cp_agg['first_cp_drop'].dt.strftime('%H:%M')
+
+    result = nights.merge(ev_agg, on='night_date', how='left').merge(cp_agg, on='night_date', how='left')
+    counts = ['vent_events', 'change_points', 'cp_drops']
+    result[counts] = result[counts].fillna(0).astype(int)
+    result['ventilated'] = result['vent_events'] > 0
+    return result
+
+def compare_oura(nightly: pd.DataFrame, oura_path: Path) -> pd.DataFrame:
+    oura = pd.read_csv(oura_path)
+    oura['night_date'] = pd.to_datetime(oura['date'], errors='coerce').dt.date
+    merged = nightly[['night_date', 'ventilated']].merge(oura, on='night_date')
+    metrics = oura.select_dtypes(include='number').columns
+    means = merged.groupby('ventilated')[metrics].mean().T
+    means = means.rename(columns={True: 'Ventilated', False: 'Sealed'})
+    means.columns.name = None
+    if {'Ventilated', 'Sealed'} <= set(means.columns):
+        means['Difference'] = means['Ventilated'] - means['Sealed']
+    return means.round(2)
+
+# --------------------- Main --------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect ventilation events in the CO₂ history")
+    parser.add_argument("--data-dir", help="Path to your data folder")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).expanduser().resolve() if args.data_dir else DATA_DIR
+    co2_path = data_dir / CO2_FILENAME
+    if not co2_path.exists():
+        sys.exit(f"❌ Missing file: {co2_path}")
+
+    print(f"📂 Using data from: {data_dir}")
+    df = load_co2(co2_path)
+    events = detect_slope_events(df)
+    changes = detect_change_points(df)
+    nightly = nightly_features(df, events, changes)
+
+    events.to_csv(data_dir / EVENTS_FILENAME, index=False)
+    nightly.to_csv(data_dir / NIGHTLY_FILENAME, index=False)
+
+    print(f"\n🌬️  Ventilation Summary ({len(df)} readings, {len(nightly)} nights)")
+    print(f" - Slope events in sleep window: {len(events)}")
+    print(f" - Ventilated nights: {int(nightly['ventilated'].sum())}")
+    print(f" - Change points: {len(changes)} ({int(nightly['cp_drops'].sum())} downward)")
+
+    oura_path = data_dir / OURA_FILENAME
+    if oura_path.exists():
+        comparison = compare_oura(nightly, oura_path)
+        if not comparison.empty:
+            print("\n📊 Oura metrics, ventilated vs sealed nights:")
+            print(comparison.to_string())
+
+    print(f"\n✅ Saved: {EVENTS_FILENAME}, {NIGHTLY_FILENAME}")
+
+
+if __name__ == "__main__":
+    main()
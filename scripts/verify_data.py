@@ -12,6 +12,8 @@ import sys
 import pandas as pd
 from pathlib import Path
 
+from data_quality import scan_quality, HISTORY_PATTERN, QA_FILENAME
+
 # --------------------- Configuration --------------------- #
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
@@ -73,8 +75,9 @@ def summarize_co2(df: pd.DataFrame) -> pd.DataFrame:
 
     low_quality = nightly_counts[nightly_counts['readings'] < MIN_CO2_READINGS_PER_NIGHT]
     print(f" - Nights with <{MIN_CO2_READINGS_PER_NIGHT} readings: {len(low_quality)}")
-    for _, row in low_quality.iterrows():
-        print(f"     • {row['night_date']}: {row['readings']} readings")
+    if not low_quality.empty:
+        print("\n".join("     • " + low_quality['night_date'].astype(str) + ": "
+                        + low_quality['readings'].astype(str) + " readings"))
 
     stats = df.groupby('night_date')['state'].agg(['min', 'max', 'mean', 'median', 'std']).reset_index()
     summary = stats.agg({
@@ -155,6 +158,30 @@ def final_verification(co2_nightly: pd.DataFrame, oura_df: pd.DataFrame, overlap
     print(f" - Overlapping nights with <{MIN_CO2_READINGS_PER_NIGHT} readings: {len(overlap_low)}")
     print("✅ Data appears structurally valid.\n")
 
+# --------------------- Sensor QA --------------------- #
+
+def report_quality(data_dir: Path) -> pd.DataFrame:
+    paths = sorted(data_dir.glob(HISTORY_PATTERN))
+    qa = scan_quality(paths)
+    qa_path = data_dir / QA_FILENAME
+    qa.to_csv(qa_path, index=False)
+
+    print("✅ Sensor QA Summary")
+    print(f" - Files scanned: {', '.join(p.name for p in paths)}")
+    summary = qa.groupby('sensor').agg(
+        nights=('night_date', 'count'),
+        flagged=('flagged', 'sum'),
+        unavailable=('unavailable', 'sum'),
+        gaps=('gaps', 'sum'),
+        spikes=('spikes', 'sum'),
+    )
+    print(summary.to_string())
+    reasons = qa.loc[qa['flagged'], 'reasons'].str.split(';').explode().value_counts()
+    if not reasons.empty:
+        print(" - Flag reasons: " + ", ".join(f"{k}={v}" for k, v in reasons.items()))
+    print(f" - QA table saved to: {qa_path}\n")
+    return qa
+
 # --------------------- Main --------------------- #
 
 def main():
@@ -170,6 +197,7 @@ def main():
 
     overlap = calculate_overlap(set(co2_nightly['night_date']), set(oura_df['date']))
     final_verification(co2_nightly, oura_df, overlap)
+    report_quality(DATA_DIR)
 
     try:
         import matplotlib.pyplot as plt
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from ventilation_events import load_co2, detect_slope_events, detect_change_points, nightly_features
+
+
+def write_history(path, start, values, freq):
+    times = pd.date_range(start, periods=len(values), freq=freq, tz="Europe/Helsinki")
+    pd.DataFrame({
+        'entity_id': 'sensor.bedroom_co2',
+        'state': values,
+        'last_changed': times.tz_convert("UTC").strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+    }).to_csv(path, index=False)
+    return load_co2(path)
+
+
+def run(df):
+    events = detect_slope_events(df)
+    return events, nightly_features(df, events, detect_change_points(df))
+
+
+def test_flat_series_has_no_events(tmp_path):
+    df = write_history(tmp_path / "co2_history.csv", "2024-10-01 22:00", [800.0] * 60, "10min")
+    events, nightly = run(df)
+
+    assert events.empty
+    assert len(nightly) == 1
+    assert nightly.loc[0, 'vent_events'] == 0
+    assert not nightly.loc[0, 'ventilated']
+    assert pd.isna(nightly.loc[0, 'first_event'])
+
+
+def test_sparse_readings_are_not_bridged(tmp_path):
+    # Falling steps two hours apart exceed MAX_STEP_MINUTES, so no run forms
+    df = write_history(tmp_path / "co2_history.csv", "2024-10-01 23:00", [1400.0, 1100.0, 800.0, 500.0], "2h")
+    events, nightly = run(df)
+
+    assert events.empty
+    assert nightly['vent_events'].sum() == 0
+
+
+def test_window_opening_is_detected(tmp_path):
+    values = [1200.0] * 12 + [1100.0, 950.0, 800.0, 700.0] + [700.0] * 12
+    df = write_history(tmp_path / "co2_history.csv", "2024-10-01 23:00", values, "5min")
+    events, nightly = run(df)
+
+    assert len(events) == 1
+    assert events.loc[0, 'drop_ppm'] == 500
+    assert nightly.loc[0, 'vent_events'] == 1
+    assert nightly.loc[0, 'first_event'] == "23:55"   # run starts at the last reading before the drop
+
+
+def test_interleaved_entities_are_kept_apart(tmp_path):
+    # Two steady sensors at different levels; alternating rows must not look like drops
+    times = pd.date_range("2024-10-01 23:00", periods=48, freq="5min", tz="Europe/Helsinki")
+    path = tmp_path / "co2_history.csv"
+    pd.DataFrame({
+        'entity_id': ['sensor.bedroom_co2', 'sensor.lounge_co2'] * 24,
+        'state': [1200.0, 600.0] * 24,
+        'last_changed': times.tz_convert("UTC").strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+    }).to_csv(path, index=False)
+    events, nightly = run(load_co2(path))
+
+    assert events.empty
+    assert nightly.loc[0, 'change_points'] == 0